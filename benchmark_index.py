@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import os.path
+import random
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from run_cache import default_cache_dir
+from smtlab_client import Client, add_client_arguments
+from smtlab_trace import run_main
+from upload_benchmark import upload_instances, walk_instances
+
+# Indexes the .smt2 files of a benchmark directory by a few syntactic
+# features, and picks stratified random samples of them, e.g. to upload as
+# a small benchmark for quick regression runs. The index is kept in the
+# cache directory and only files whose size or mtime changed are rescanned.
+
+# strings, quoted symbols, comments, parentheses and other tokens
+TOKEN = re.compile(rb'"(?:[^"]|"")*"|\|[^|]*\||;[^\n]*|[()]|[^\s()";|]+')
+
+DECLARATIONS = (b'declare-fun', b'declare-const', b'declare-sort', b'set-logic')
+
+def parse_sexpr(tokens, pos):
+    # returns (expression, next position); lists become Python lists
+    if tokens[pos] == b'(':
+        items = []
+        pos += 1
+        while tokens[pos] != b')':
+            item, pos = parse_sexpr(tokens, pos)
+            items.append(item)
+        return items, pos + 1
+    return tokens[pos].decode(errors='replace'), pos + 1
+
+def render(expr):
+    if isinstance(expr, list):
+        return "(" + " ".join(render(item) for item in expr) + ")"
+    return expr
+
+def scan(data):
+    # features of the SMT-LIB script in data, from its top-level commands
+    logic = None
+    asserts = 0
+    check_sats = 0
+    sorts = set()
+    depth = 0
+    command = None
+    command_tokens = None
+    for m in TOKEN.finditer(data):
+        token = m.group()
+        if token[0] == 59:  # ';'
+            continue
+        if token == b'(':
+            if depth == 0:
+                command = None
+                command_tokens = [token]
+            elif command_tokens is not None:
+                command_tokens.append(token)
+            depth += 1
+            continue
+        if token == b')':
+            depth -= 1
+            if command_tokens is not None:
+                command_tokens.append(token)
+            if depth == 0 and command_tokens is not None:
+                try:
+                    expr, _ = parse_sexpr(command_tokens, 0)
+                except IndexError:
+                    expr = []
+                if command == b'set-logic' and len(expr) > 1:
+                    logic = render(expr[1])
+                elif command == b'declare-sort' and len(expr) > 1:
+                    sorts.add(render(expr[1]))
+                elif command == b'declare-const' and len(expr) > 2:
+                    sorts.add(render(expr[2]))
+                elif command == b'declare-fun' and len(expr) > 3 and isinstance(expr[2], list):
+                    sorts.update(render(sort) for sort in expr[2])
+                    sorts.add(render(expr[3]))
+                command_tokens = None
+            elif depth < 0:
+                depth = 0
+            continue
+        if depth == 1 and command is None:
+            command = token
+            if token == b'assert':
+                asserts += 1
+            elif token in (b'check-sat', b'check-sat-assuming'):
+                check_sats += 1
+            if token not in DECLARATIONS:
+                # only declarations are parsed; assertions can be very large
+                command_tokens = None
+                continue
+        if command_tokens is not None:
+            command_tokens.append(token)
+    return {'logic': logic, 'asserts': asserts, 'check_sats': check_sats, 'sorts': sorted(sorts)}
+
+def index_file(path):
+    # runs in a worker process
+    try:
+        with open(path, 'rb') as f_instance:
+            return scan(f_instance.read())
+    except OSError as e:
+        return {'error': str(e)}
+
+def index_path(root):
+    root_key = hashlib.sha256(os.path.abspath(root).encode()).hexdigest()[:16]
+    return os.path.join(default_cache_dir(), "index", "{}.json".format(root_key))
+
+def load_index(path):
+    # {name: {'size', 'mtime', 'logic', 'asserts', 'check_sats', 'sorts'}}
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f_index:
+        return json.load(f_index)['files']
+
+def save_index(path, root, files):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f_index:
+        json.dump({'root': os.path.abspath(root), 'files': files}, f_index)
+    os.replace(tmp_path, path)
+
+def update_index(root, index, jobs, verbose=False):
+    # rescans new and changed .smt2 files under root on a process pool and
+    # drops files that no longer exist; returns the number of files scanned
+    paths = {}
+    stale = []
+    for name, filepath in walk_instances(root):
+        if not name.endswith(".smt2"):
+            continue
+        st = os.stat(filepath)
+        paths[name] = filepath
+        entry = index.get(name)
+        if entry is None or entry['size'] != st.st_size or entry['mtime'] != st.st_mtime_ns:
+            stale.append((name, st))
+    for name in [name for name in index if name not in paths]:
+        del index[name]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        features = executor.map(index_file, [paths[name] for name, st in stale], chunksize=16)
+        for n, ((name, st), entry) in enumerate(zip(stale, features), 1):
+            index[name] = dict(entry, size=st.st_size, mtime=st.st_mtime_ns)
+            if verbose and n % 1000 == 0:
+                print(f"Indexed {n}/{len(stale)} files.")
+    return len(stale)
+
+def magnitude(n):
+    # 0, 1-9, 10-99, ... as '0', '1', '10', ...
+    return "0" if n <= 0 else str(10 ** int(math.log10(n)))
+
+def sort_families(sorts):
+    # (_ BitVec 32) -> BitVec, (Array Int Int) -> Array
+    families = set()
+    for sort in sorts:
+        words = sort.replace("(", " ").split()
+        families.add(words[1] if words[0] == "_" and len(words) > 1 else words[0])
+    return "+".join(sorted(families))
+
+STRATA = {
+    'logic': lambda entry: entry['logic'] or "none",
+    'size': lambda entry: magnitude(entry['size']) + "B",
+    'asserts': lambda entry: magnitude(entry['asserts']) + " asserts",
+    'incremental': lambda entry: "incremental" if entry['check_sats'] > 1 else "single",
+    'sorts': lambda entry: sort_families(entry['sorts']) or "no sorts",
+}
+
+def stratify(index, keys):
+    strata = {}
+    for name in sorted(index):
+        entry = index[name]
+        if 'error' in entry:
+            continue
+        strata.setdefault(tuple(STRATA[key](entry) for key in keys), []).append(name)
+    return strata
+
+def allocate(sizes, n):
+    # splits n over the strata in proportion to their sizes (largest
+    # remainder), taking at least one from each stratum when n allows
+    n = min(n, sum(sizes.values()))
+    base = dict.fromkeys(sizes, 1 if n >= len(sizes) else 0)
+    rest = {stratum: sizes[stratum] - base[stratum] for stratum in sizes}
+    remaining = n - sum(base.values())
+    rest_total = sum(rest.values())
+    quotas = {stratum: remaining * rest[stratum] / rest_total if rest_total else 0 for stratum in sizes}
+    counts = {stratum: base[stratum] + int(quotas[stratum]) for stratum in sizes}
+    leftover = n - sum(counts.values())
+    for stratum in sorted(sizes, key=lambda stratum: (int(quotas[stratum]) - quotas[stratum], stratum))[:leftover]:
+        counts[stratum] += 1
+    return counts
+
+def sample(strata, n, seed):
+    rng = random.Random(seed)
+    counts = allocate({stratum: len(names) for stratum, names in strata.items()}, n)
+    return {stratum: sorted(rng.sample(strata[stratum], counts[stratum])) for stratum in sorted(strata)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Index SMT2 benchmarks and pick stratified samples of them")
+    add_client_arguments(parser)
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="Number of processes scanning files (default: number of CPUs)")
+    parser.add_argument('--index', help="Index file (default: one per benchmark directory in the cache directory)")
+    parser.add_argument('-n', '--sample', type=int, help="Pick a stratified random sample of this many instances")
+    parser.add_argument('--strata', default="logic", help=f"Comma-separated features to stratify by, from {', '.join(STRATA)} (default: logic)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed and index give the same sample (default: 0)")
+    parser.add_argument('-o', '--output', help="Write the names of the sampled instances to this file, one per line")
+    parser.add_argument('--upload', metavar="NAME", help="Upload the sample as a new benchmark with this name")
+    parser.add_argument('-v', '--verbose', default=False, action='store_true')
+    parser.add_argument("path", help="path to benchmark folder; all .smt2 files under this path are indexed")
+
+    args = parser.parse_args()
+    strata_keys = args.strata.split(",")
+    for key in strata_keys:
+        if key not in STRATA:
+            print(f"error: unknown feature '{key}' in --strata")
+            sys.exit(1)
+    if (args.output or args.upload) and args.sample is None:
+        print("error: --output and --upload need --sample")
+        sys.exit(1)
+    if args.jobs < 1:
+        print("error: --jobs must be at least 1")
+        sys.exit(1)
+    client = None
+    if args.upload:
+        # fail on missing configuration before the scan rather than after it
+        client = Client.from_args(args)
+
+    index_file_path = args.index or index_path(args.path)
+    index = load_index(index_file_path)
+    try:
+        nScanned = update_index(args.path, index, args.jobs, args.verbose)
+    finally:
+        save_index(index_file_path, args.path, index)
+    strata = stratify(index, strata_keys)
+    nErrors = sum(1 for entry in index.values() if 'error' in entry)
+    print(f"{len(index)} instances in the index ({nScanned} scanned, {nErrors} unreadable), {len(strata)} strata by {args.strata}")
+
+    chosen = sample(strata, args.sample, args.seed) if args.sample is not None else {}
+    width = max([len(" / ".join(stratum)) for stratum in strata] + [len("stratum")])
+    print()
+    print(f"{'stratum':<{width}} {'instances':>10}" + (f" {'sampled':>8}" if chosen else ""))
+    for stratum in sorted(strata):
+        print(f"{' / '.join(stratum):<{width}} {len(strata[stratum]):>10}" + (f" {len(chosen[stratum]):>8}" if chosen else ""))
+    if not chosen:
+        return
+    names = sorted(name for names in chosen.values() for name in names)
+    print()
+    print(f"Sampled {len(names)} instances.")
+
+    if args.output:
+        with open(args.output, 'w') as f_out:
+            f_out.write("".join(name + "\n" for name in names))
+    if args.upload:
+        benchmark_id = client.post_json("/benchmarks", {'name': args.upload})['id']
+        paths = [(name, os.path.join(args.path, name)) for name in names]
+        count = upload_instances(client, benchmark_id, args.path, paths, set(), verbose=args.verbose)
+        print(f"Uploaded {count} instances as benchmark {benchmark_id}.")
+        if args.verbose:
+            print(client.transfer_summary())
+
+if __name__ == '__main__':
+    run_main(main)
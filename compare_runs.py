@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+import argparse
+import csv
+import sys
+import numpy as np
+from run_cache import add_cache_arguments, open_cache
+from smtlab_client import Client, add_client_arguments
+from results import fetch_run, index_by, load_local_run, name_of, run_argument
+from smtlab_trace import run_main
+
+SAT = 0
+UNSAT = 1
+UNKNOWN = 2
+TIMEOUT = 3
+ERROR = 4
+MISSING = 5
+STATUS_CODES = {'sat': SAT, 'unsat': UNSAT, 'unknown': UNKNOWN, 'timeout': TIMEOUT, 'error': ERROR}
+
+def load_matrix(runs):
+    # aligns the results of all runs by instance, in the benchmark order of
+    # the first run: returns (instances, status[run, instance],
+    # runtime[run, instance] in seconds); local runs have their own
+    # instance IDs, so their instances are matched by name
+    instances = runs[0]['instances']
+    column = {instance.id: i for i, instance in enumerate(instances)}
+    column_by_name = None
+    status = np.full((len(runs), len(instances)), MISSING, dtype=np.int8)
+    runtime = np.full((len(runs), len(instances)), np.nan)
+    for k, run in enumerate(runs):
+        run_column = column
+        if k > 0 and (run.get('local') or runs[0].get('local')):
+            if column_by_name is None:
+                column_by_name = {instance.name: i for i, instance in enumerate(instances)}
+            run_column = {instance.id: column_by_name.get(instance.name, -1) for instance in run['instances']}
+        results = run['results']
+        n = len(results)
+        cols = np.fromiter((run_column.get(result.instance_id, -1) for result in results), dtype=np.int64, count=n)
+        codes = np.fromiter((STATUS_CODES.get(result.result, UNKNOWN) for result in results), dtype=np.int8, count=n)
+        times = np.fromiter((result.runtime for result in results), dtype=np.float64, count=n) * 0.001
+        keep = cols >= 0
+        status[k, cols[keep]] = codes[keep]
+        runtime[k, cols[keep]] = times[keep]
+    return instances, status, runtime
+
+def default_timeout(status, runtime):
+    # the longest recorded timeout, or failing that the longest runtime
+    timeouts = runtime[status == TIMEOUT]
+    if timeouts.size > 0:
+        return float(timeouts.max())
+    if np.isfinite(runtime).any():
+        return float(np.nanmax(runtime))
+    return 0.0
+
+def compare(status, runtime, timeout):
+    solved = (status == SAT) | (status == UNSAT)
+    # clamp so that 0 ms results do not produce infinite speedups
+    solved_time = np.where(solved, np.maximum(runtime, 0.001), np.inf)
+    stats = {}
+    stats['solved'] = solved
+    stats['n_solved'] = solved.sum(axis=1)
+    stats['n_status'] = np.stack([(status == code).sum(axis=1) for code in range(MISSING + 1)], axis=1)
+    stats['par2'] = np.where(solved, runtime, 2.0 * timeout).sum(axis=1)
+    stats['gained'] = (solved & ~solved[0]).sum(axis=1)
+    stats['lost'] = (~solved & solved[0]).sum(axis=1)
+    # per-instance speedup of each run over the first run, on instances both solved
+    both = solved & solved[0]
+    speedup = np.where(both, solved_time[0] / np.where(both, solved_time, 1.0), np.nan)
+    stats['speedup'] = speedup
+    n_both = both.sum(axis=1)
+    log_speedup = np.where(both, np.log(np.where(both, speedup, 1.0)), 0.0).sum(axis=1)
+    stats['geomean_speedup'] = np.where(n_both > 0, np.exp(log_speedup / np.maximum(n_both, 1)), np.nan)
+    # instances on which some run answered sat and another unsat
+    stats['disagreements'] = np.flatnonzero((status == SAT).any(axis=0) & (status == UNSAT).any(axis=0))
+    # virtual best solver: the fastest run that solved each instance
+    vbs_solved = solved.any(axis=0)
+    stats['vbs_solved'] = vbs_solved
+    stats['vbs_run'] = np.where(vbs_solved, np.argmin(solved_time, axis=0), -1)
+    stats['vbs_time'] = np.where(vbs_solved, solved_time.min(axis=0), np.nan)
+    stats['vbs_par2'] = np.where(vbs_solved, stats['vbs_time'], 2.0 * timeout).sum()
+    stats['unique'] = (solved & (solved.sum(axis=0) == 1)).sum(axis=1)
+    stats['vbs_wins'] = np.bincount(stats['vbs_run'][vbs_solved], minlength=len(status))
+    return stats
+
+def cactus(status, runtime):
+    # for each run, the sorted runtimes of the instances it solved
+    solved = (status == SAT) | (status == UNSAT)
+    return [np.sort(runtime[k][solved[k]]) for k in range(len(status))]
+
+def write_cactus(path, labels, curves):
+    with open(path, 'w', newline='') as f_out:
+        writer = csv.writer(f_out)
+        writer.writerow(['solved'] + labels)
+        for n in range(max((len(curve) for curve in curves), default=0)):
+            writer.writerow([n + 1] + [f"{curve[n]:.3f}" if n < len(curve) else "" for curve in curves])
+
+def write_per_instance(path, labels, instances, status, runtime, stats):
+    status_names = ['sat', 'unsat', 'unknown', 'timeout', 'error', '']
+    with open(path, 'w', newline='') as f_out:
+        writer = csv.writer(f_out)
+        header = ['instance']
+        for label in labels:
+            header += [f"{label} result", f"{label} runtime"]
+        for label in labels[1:]:
+            header.append(f"{label} speedup")
+        header += ['vbs runtime', 'vbs run']
+        writer.writerow(header)
+        for i, instance in enumerate(instances):
+            row = [instance.name]
+            for k in range(len(labels)):
+                row += [status_names[status[k, i]], "" if np.isnan(runtime[k, i]) else f"{runtime[k, i]:.3f}"]
+            for k in range(1, len(labels)):
+                speedup = stats['speedup'][k, i]
+                row.append("" if np.isnan(speedup) else f"{speedup:.3f}")
+            if stats['vbs_solved'][i]:
+                row += [f"{stats['vbs_time'][i]:.3f}", labels[stats['vbs_run'][i]]]
+            else:
+                row += ["", ""]
+            writer.writerow(row)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SMTLab runs on the same benchmark")
+    add_client_arguments(parser)
+    add_cache_arguments(parser)
+    parser.add_argument('--par2-timeout', type=float, help="Solver timeout in seconds used for PAR-2 scores (default: longest recorded timeout)")
+    parser.add_argument('--cactus', help="Write cactus plot data (sorted runtimes of solved instances per run) to this CSV file")
+    parser.add_argument('--per-instance', help="Write per-instance results, speedups and virtual best solver to this CSV file")
+    parser.add_argument('run_ids', nargs='+', type=run_argument,
+                        help="IDs of the runs, or run files written by 'run_solver.py --local', to compare; the first is the baseline")
+    args = parser.parse_args()
+
+    client = None
+    cache = None
+    if any(isinstance(run_id, int) for run_id in args.run_ids):
+        client = Client.from_args(args)
+        cache = open_cache(args)
+    # only the results are needed, not their details, so runs that are not
+    # complete in the cache are not written to it
+    runs = [load_local_run(run_id) if isinstance(run_id, str) else fetch_run(client, cache, run_id, store=False) for run_id in args.run_ids]
+    if cache is not None:
+        cache.close()
+    # local runs on a directory rather than an uploaded benchmark have no benchmark ID
+    benchmark_ids = set(run['run']['benchmark_id'] for run in runs if run['run']['benchmark_id'] is not None)
+    if len(benchmark_ids) > 1:
+        print("error: all runs must be on the same benchmark")
+        sys.exit(1)
+
+    labels = [f"{run['run']['id']}:{name_of(index_by(run['solvers'], 'id'), run['run']['solver_id'])}" for run in runs]
+    if any(run.get('local') for run in runs):
+        # runs are then matched by instance name, which the benchmark check
+        # above cannot vouch for
+        names = set(instance.name for instance in runs[0]['instances'])
+        for label, run in zip(labels[1:], runs[1:]):
+            run_names = set(instance.name for instance in run['instances'])
+            common = len(names & run_names)
+            if common == 0:
+                print(f"error: {label} has no instances in common with {labels[0]}; all runs must be on the same benchmark")
+                sys.exit(1)
+            if common < max(len(names), len(run_names)):
+                print(f"warning: {label} has {common} of {len(run_names)} instances in common with {labels[0]}, which has {len(names)}")
+    instances, status, runtime = load_matrix(runs)
+    timeout = args.par2_timeout if args.par2_timeout is not None else default_timeout(status, runtime)
+    stats = compare(status, runtime, timeout)
+
+    print(f"Benchmark: {runs[0]['benchmark']['name']} ({len(instances)} instances), PAR-2 timeout {timeout:.3f} seconds")
+    print()
+    width = max(len(label) for label in labels + ["virtual best"])
+    print(f"{'run':<{width}} {'solved':>7} {'sat':>7} {'unsat':>7} {'timeout':>7} {'error':>7} {'PAR-2':>12} {'+':>6} {'-':>6} {'speedup':>8} {'unique':>7} {'vbs':>7}")
+    for k, label in enumerate(labels):
+        n_status = stats['n_status'][k]
+        geomean = stats['geomean_speedup'][k]
+        speedup = "" if np.isnan(geomean) else f"{geomean:.3f}x"
+        print(f"{label:<{width}} {stats['n_solved'][k]:>7} {n_status[SAT]:>7} {n_status[UNSAT]:>7} {n_status[TIMEOUT]:>7} {n_status[ERROR]:>7} "
+              f"{stats['par2'][k]:>12.3f} {stats['gained'][k]:>6} {stats['lost'][k]:>6} {speedup:>8} {stats['unique'][k]:>7} {stats['vbs_wins'][k]:>7}")
+    print(f"{'virtual best':<{width}} {stats['vbs_solved'].sum():>7} {'':>7} {'':>7} {'':>7} {'':>7} {stats['vbs_par2']:>12.3f}")
+    print()
+    print(f"{len(stats['disagreements'])} instances with sat/unsat disagreements.")
+    for i in stats['disagreements']:
+        answers = ", ".join(f"{labels[k]}: {'sat' if status[k, i] == SAT else 'unsat'}" for k in range(len(labels)) if status[k, i] in (SAT, UNSAT))
+        print(f"- {instances[i].name}: {answers}")
+
+    if args.cactus:
+        write_cactus(args.cactus, labels, cactus(status, runtime))
+    if args.per_instance:
+        write_per_instance(args.per_instance, labels, instances, status, runtime, stats)
+
+if __name__ == '__main__':
+    run_main(main)
@@ -1,11 +1,11 @@
 #!/usr/bin/env python
 
 import argparse
-import requests
 import sys
-import os
 import secrets
 import getpass
+from smtlab_client import Client, add_client_arguments
+from smtlab_trace import run_main
 
 roles = {}
 roles['readonly'] = ['read']
@@ -19,15 +19,13 @@ def mkpasswd(length=32):
     
 def main():
     parser = argparse.ArgumentParser(description='Create an SMTLab user')
-    parser.add_argument('--endpoint', help="Base URL of API endpoint", default=os.environ['SMTLAB_API_ENDPOINT'])
+    add_client_arguments(parser)
     parser.add_argument('-r', '--role', type=str, default=None, help="Role (quick permissions) for account: readonly, user, admin, scheduler, worker")
     parser.add_argument('-p', '--password', default=False, action='store_true', help="Prompt for password (otherwise, randomly generate one)")
     parser.add_argument('username', type=str, help="Username of the new account")
 
-    auth_username = os.environ['SMTLAB_USERNAME']
-    auth_password = os.environ['SMTLAB_PASSWORD']
-    
     args = parser.parse_args()
+    client = Client.from_args(args)
     if args.role is None:
         # TODO
         pass
@@ -47,14 +45,11 @@ def main():
     else:
          pw = mkpasswd()
     request_body = {'username': args.username, 'password': pw, 'permissions': perms}
-    r = requests.post(args.endpoint + "/users/create", json=request_body, auth=(auth_username, auth_password))
-    if r.status_code != requests.codes.ok:
-        print(r.json())
-        r.raise_for_status()
+    client.post_json("/users/create", request_body)
     print(f"Created user {args.username}.")
     if not args.password:
         print("The generated password for this account is:")
         print(f"{pw}")
 
 if __name__ == '__main__':
-    main()
+    run_main(main)
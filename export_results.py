@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import argparse
+import csv
+import json
+import sys
+from smtlab_client import Client, add_client_arguments, ordered_map
+from results import check_validations, index_by, name_of
+from smtlab_trace import run_main
+
+FORMATS = ['csv', 'jsonl', 'parquet']
+
+RESULT_COLUMNS = ['run_id', 'solver_id', 'solver', 'benchmark_id', 'benchmark', 'performance', 'arguments',
+                  'result_id', 'instance_id', 'instance', 'result', 'runtime_ms']
+DETAIL_COLUMNS = ['stdout', 'validations', 'n_validations', 'n_validation_errors']
+
+class CSVWriter:
+    def __init__(self, path, columns):
+        self.f_out = open(path, 'w', newline='')
+        self.writer = csv.DictWriter(self.f_out, fieldnames=columns)
+        self.writer.writeheader()
+
+    def write_batch(self, rows):
+        self.writer.writerows(rows)
+        self.f_out.flush()
+
+    def close(self):
+        self.f_out.close()
+
+class JSONLWriter:
+    def __init__(self, path, columns):
+        self.f_out = open(path, 'w')
+
+    def write_batch(self, rows):
+        self.f_out.write("".join(json.dumps(row) + "\n" for row in rows))
+        self.f_out.flush()
+
+    def close(self):
+        self.f_out.close()
+
+class ParquetWriter:
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        types = {'run_id': pa.int64(), 'solver_id': pa.int64(), 'benchmark_id': pa.int64(), 'performance': pa.bool_(),
+                 'result_id': pa.int64(), 'instance_id': pa.int64(), 'runtime_ms': pa.int64(),
+                 'n_validations': pa.int64(), 'n_validation_errors': pa.int64()}
+        self.pa = pa
+        self.schema = pa.schema([(column, types.get(column, pa.string())) for column in columns])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write_batch(self, rows):
+        # each batch becomes one row group
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+WRITERS = {'csv': CSVWriter, 'jsonl': JSONLWriter, 'parquet': ParquetWriter}
+
+def batched(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def export_rows(client, run_ids, details, jobs):
+    # yields one row per result of each run, as the results are received
+    solvers_by_id = index_by(client.get_json("/solvers"), 'id')
+    instance_names = {}
+    instance_names_benchmark_id = None
+    for run_id in run_ids:
+        run_info = client.get_json(f"/runs/{run_id}")
+        benchmark_info = client.get_json(f"/benchmarks/{run_info['benchmark_id']}")
+        if instance_names_benchmark_id != run_info['benchmark_id']:
+            instance_names = {}
+            for instance in client.get_json_stream(f"/benchmarks/{run_info['benchmark_id']}/instances"):
+                instance_names[instance['id']] = instance['name']
+            instance_names_benchmark_id = run_info['benchmark_id']
+        run_row = {'run_id': run_info['id'], 'solver_id': run_info['solver_id'], 'solver': name_of(solvers_by_id, run_info['solver_id']),
+                   'benchmark_id': run_info['benchmark_id'], 'benchmark': benchmark_info['name'],
+                   'performance': run_info.get('performance'), 'arguments': run_info.get('arguments')}
+        results = client.get_json_stream(f"/runs/{run_id}/results")
+        if details:
+            pairs = ordered_map(lambda result: (result, client.get_json(f"/results/{result['id']}")), results, jobs)
+        else:
+            pairs = ((result, None) for result in results)
+        for result, detailed_result_info in pairs:
+            row = dict(run_row, result_id=result['id'], instance_id=result['instance_id'],
+                       instance=instance_names.get(result['instance_id']), result=result['result'], runtime_ms=result['runtime'])
+            if detailed_result_info is not None:
+                validations = detailed_result_info['validations']
+                nValidationsOK, errorValidations = check_validations(result['result'], validations)
+                row['stdout'] = detailed_result_info.get('stdout')
+                row['validations'] = json.dumps(validations)
+                row['n_validations'] = len(validations)
+                row['n_validation_errors'] = len(errorValidations)
+            yield row
+
+def main():
+    parser = argparse.ArgumentParser(description="Export results of SMTLab benchmark runs")
+    add_client_arguments(parser)
+    parser.add_argument('-f', '--format', choices=FORMATS, help="Output format (default: from the output file extension)")
+    parser.add_argument('-o', '--output', required=True, help="Output file; all runs are written to this one file")
+    parser.add_argument('-d', '--details', default=False, action='store_true', help="Include solver output and validations of each result")
+    parser.add_argument('-j', '--jobs', type=int, default=16, help="Maximum number of concurrent requests when fetching result details (default: 16)")
+    parser.add_argument('--batch-size', type=int, default=10000, help="Number of rows written at a time, and per Parquet row group (default: 10000)")
+    parser.add_argument('run_ids', nargs='+', type=int, help="IDs of the runs to export")
+    args = parser.parse_args()
+
+    output_format = args.format
+    if output_format is None:
+        output_format = args.output.rsplit('.', 1)[-1].lower()
+        if output_format not in FORMATS:
+            print(f"error: cannot tell the output format from '{args.output}'; use --format")
+            sys.exit(1)
+    columns = RESULT_COLUMNS + (DETAIL_COLUMNS if args.details else [])
+
+    client = Client.from_args(args, pool_size=args.jobs)
+    writer = WRITERS[output_format](args.output, columns)
+    nRows = 0
+    try:
+        for batch in batched(export_rows(client, args.run_ids, args.details, args.jobs), args.batch_size):
+            writer.write_batch(batch)
+            nRows += len(batch)
+    finally:
+        writer.close()
+    print(f"Exported {nRows} results from {len(args.run_ids)} runs to {args.output}.")
+
+if __name__ == '__main__':
+    run_main(main)
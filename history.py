@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import os.path
+import sqlite3
+import sys
+import time
+from results import check_validations, fetch_result_details, fetch_run, index_by, name_of
+from run_cache import add_cache_arguments, open_cache
+from smtlab_client import Client, add_client_arguments
+from smtlab_trace import run_main
+
+# Local index of per-instance outcomes across all runs on a benchmark, for
+# spotting regressions without opening one report per run. Only runs that
+# are not in the index yet are downloaded; the reports are SQL queries on
+# the index.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    endpoint TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    benchmark_id INTEGER NOT NULL,
+    solver_id INTEGER NOT NULL,
+    solver TEXT NOT NULL,
+    arguments TEXT,
+    start_date TEXT,
+    validations INTEGER NOT NULL,
+    PRIMARY KEY (endpoint, run_id)
+);
+CREATE TABLE IF NOT EXISTS instances (
+    endpoint TEXT NOT NULL,
+    benchmark_id INTEGER NOT NULL,
+    instance_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (endpoint, benchmark_id, instance_id)
+);
+CREATE TABLE IF NOT EXISTS outcomes (
+    endpoint TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    benchmark_id INTEGER NOT NULL,
+    instance_id INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    runtime INTEGER NOT NULL,
+    validation_errors INTEGER,
+    PRIMARY KEY (endpoint, run_id, instance_id)
+);
+CREATE INDEX IF NOT EXISTS outcomes_by_instance ON outcomes (endpoint, benchmark_id, instance_id);
+"""
+
+class History:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def known_runs(self, endpoint, benchmark_id):
+        return set(run_id for run_id, in self.db.execute("SELECT run_id FROM runs WHERE endpoint = ? AND benchmark_id = ?",
+                                                         (endpoint, benchmark_id)))
+
+    def store_run(self, endpoint, run_info, solver_name, instances, results, validation_errors):
+        # validation_errors is {result_id: number of failed validations}, or
+        # None if the validations of this run were not fetched
+        benchmark_id = run_info['benchmark_id']
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO instances (endpoint, benchmark_id, instance_id, name) VALUES (?, ?, ?, ?)",
+                                ((endpoint, benchmark_id, instance.id, instance.name) for instance in instances))
+            self.db.executemany("INSERT OR REPLACE INTO outcomes (endpoint, run_id, benchmark_id, instance_id, result, runtime, validation_errors) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                ((endpoint, run_info['id'], benchmark_id, result.instance_id, result.result, result.runtime,
+                                  validation_errors.get(result.id) if validation_errors is not None else None) for result in results))
+            self.db.execute("INSERT OR REPLACE INTO runs (endpoint, run_id, benchmark_id, solver_id, solver, arguments, start_date, validations) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (endpoint, run_info['id'], benchmark_id, run_info['solver_id'], solver_name, run_info.get('arguments'),
+                             run_info.get('start_date'), validation_errors is not None))
+
+    def runs(self, endpoint, benchmark_id):
+        # (run_id, solver, arguments) of the indexed runs, oldest first
+        return self.db.execute("SELECT run_id, solver, arguments FROM runs WHERE endpoint = ? AND benchmark_id = ? ORDER BY run_id",
+                               (endpoint, benchmark_id)).fetchall()
+
+    def runtime_changes(self, endpoint, run_id, baseline_id, ratio, min_runtime_ms):
+        # (name, baseline runtime, runtime) of the instances both runs solved
+        # whose runtime changed by more than ratio either way
+        return self.db.execute(
+            "SELECT i.name, b.runtime, t.runtime FROM outcomes t "
+            "JOIN outcomes b ON b.endpoint = t.endpoint AND b.run_id = ? AND b.instance_id = t.instance_id "
+            "JOIN instances i ON i.endpoint = t.endpoint AND i.benchmark_id = t.benchmark_id AND i.instance_id = t.instance_id "
+            "WHERE t.endpoint = ? AND t.run_id = ? AND t.result IN ('sat', 'unsat') AND b.result IN ('sat', 'unsat') "
+            "AND MAX(t.runtime, b.runtime) >= ? "
+            "AND (t.runtime > ? * MAX(b.runtime, 1) OR b.runtime > ? * MAX(t.runtime, 1)) "
+            "ORDER BY CAST(t.runtime AS REAL) / MAX(b.runtime, 1) DESC",
+            (baseline_id, endpoint, run_id, min_runtime_ms, ratio, ratio)).fetchall()
+
+    def new_timeouts(self, endpoint, run_id, baseline_id):
+        # (name, baseline result, baseline runtime) of the instances that
+        # timed out in the run but not in the baseline
+        return self.db.execute(
+            "SELECT i.name, b.result, b.runtime FROM outcomes t "
+            "JOIN outcomes b ON b.endpoint = t.endpoint AND b.run_id = ? AND b.instance_id = t.instance_id "
+            "JOIN instances i ON i.endpoint = t.endpoint AND i.benchmark_id = t.benchmark_id AND i.instance_id = t.instance_id "
+            "WHERE t.endpoint = ? AND t.run_id = ? AND t.result = 'timeout' AND b.result != 'timeout' ORDER BY i.name",
+            (baseline_id, endpoint, run_id)).fetchall()
+
+    def flips(self, endpoint, run_id):
+        # {name: (answer, [(other run, other answer)])} for the instances on
+        # which the run answered sat or unsat and some other run the opposite
+        flips = {}
+        for name, answer, other_run_id, other_answer in self.db.execute(
+                "SELECT i.name, t.result, o.run_id, o.result FROM outcomes t "
+                "JOIN outcomes o ON o.endpoint = t.endpoint AND o.benchmark_id = t.benchmark_id AND o.instance_id = t.instance_id "
+                "JOIN instances i ON i.endpoint = t.endpoint AND i.benchmark_id = t.benchmark_id AND i.instance_id = t.instance_id "
+                "WHERE t.endpoint = ? AND t.run_id = ? AND t.result IN ('sat', 'unsat') AND o.result IN ('sat', 'unsat') "
+                "AND o.result != t.result ORDER BY i.name, o.run_id",
+                (endpoint, run_id)):
+            flips.setdefault(name, (answer, []))[1].append((other_run_id, other_answer))
+        return flips
+
+    def recurring_validation_failures(self, endpoint, benchmark_id, min_runs):
+        # (name, number of runs, latest run) of the instances with failed
+        # validations in at least min_runs runs
+        return self.db.execute(
+            "SELECT i.name, COUNT(*), MAX(o.run_id) FROM outcomes o "
+            "JOIN instances i ON i.endpoint = o.endpoint AND i.benchmark_id = o.benchmark_id AND i.instance_id = o.instance_id "
+            "WHERE o.endpoint = ? AND o.benchmark_id = ? AND o.validation_errors > 0 "
+            "GROUP BY o.instance_id HAVING COUNT(*) >= ? ORDER BY COUNT(*) DESC, i.name",
+            (endpoint, benchmark_id, min_runs)).fetchall()
+
+def ingest_run(client, cache, history, run_id, solvers_by_id, validations, jobs):
+    # adds one run to the history; complete runs in the results cache are
+    # read from there. Returns False if the run is still in progress.
+    run = None
+    if cache is not None:
+        run = cache.load_run(client.endpoint, run_id)
+    cached = run is not None
+    if not cached:
+        run = fetch_run(client, None, run_id)
+    if len(run['results']) < len(run['instances']):
+        return False
+    validation_errors = None
+    if validations:
+        # only sat and unsat answers are validated
+        answered = [result for result in run['results'] if result.result in ('sat', 'unsat')]
+        result_ids = [result.id for result in answered]
+        if cached:
+            details = cache.iter_details(client.endpoint, run_id, result_ids)
+        else:
+            details = fetch_result_details(client, result_ids, jobs)
+        validation_errors = {}
+        for result, detailed_result_info in zip(answered, details):
+            nValidationsOK, errorValidations = check_validations(result.result, detailed_result_info['validations'])
+            validation_errors[result.id] = len(errorValidations)
+    history.store_run(client.endpoint, run['run'], name_of(solvers_by_id, run['run']['solver_id']),
+                      run['instances'], run['results'], validation_errors)
+    return True
+
+def update_history(client, cache, history, benchmark_id, validations, jobs, verbose=False):
+    # ingests the finished runs on the benchmark that are not in the history
+    # yet; returns (number ingested, number still in progress)
+    solvers_by_id = index_by(client.get_json("/solvers"), 'id')
+    known = history.known_runs(client.endpoint, benchmark_id)
+    new_run_ids = sorted(run['id'] for run in client.get_json("/runs") if run['benchmark_id'] == benchmark_id and run['id'] not in known)
+    nIngested = 0
+    nInProgress = 0
+    for run_id in new_run_ids:
+        if ingest_run(client, cache, history, run_id, solvers_by_id, validations, jobs):
+            nIngested += 1
+            if verbose:
+                print(f"Indexed run {run_id}.")
+        else:
+            nInProgress += 1
+            if verbose:
+                print(f"Skipped run {run_id}, which is still in progress.")
+    return nIngested, nInProgress
+
+def find_baseline(runs, run_id):
+    # the latest earlier run of the same solver with the same arguments, or
+    # failing that of the same solver
+    earlier = [run for run in runs if run[0] < run_id]
+    target = [run for run in runs if run[0] == run_id][0]
+    for same in (lambda run: run[1:] == target[1:], lambda run: run[1] == target[1]):
+        candidates = [run for run in earlier if same(run)]
+        if candidates:
+            return candidates[-1][0]
+    return None
+
+def describe_runs(run_ids, limit=5):
+    text = ("run " if len(run_ids) == 1 else "runs ") + ", ".join(str(run_id) for run_id in run_ids[-limit:])
+    if len(run_ids) > limit:
+        text += f" and {len(run_ids) - limit} earlier"
+    return text
+
+def print_limited(lines, limit):
+    for line in lines[:limit]:
+        print(line)
+    if len(lines) > limit:
+        print(f"  ... and {len(lines) - limit} more")
+
+def main():
+    parser = argparse.ArgumentParser(description="Track per-instance outcomes across the runs on an SMTLab benchmark")
+    add_client_arguments(parser)
+    add_cache_arguments(parser)
+    parser.add_argument('-r', '--run', type=int, help="Run to report on (default: the latest indexed run on the benchmark)")
+    parser.add_argument('--baseline', type=int, help="Run to compare runtimes and timeouts with (default: the previous run of the same solver and arguments)")
+    parser.add_argument('--ratio', type=float, default=2.0, help="Report instances whose runtime changed by more than this factor (default: 2.0)")
+    parser.add_argument('--min-runtime', type=float, default=1.0, help="Ignore runtime changes of instances solved in less than this many seconds (default: 1.0)")
+    parser.add_argument('--recurring', type=int, default=2, help="Report instances with failed validations in at least this many runs (default: 2)")
+    parser.add_argument('--no-validations', default=False, action='store_true', help="Do not fetch result details for validations when indexing runs")
+    parser.add_argument('--no-update', default=False, action='store_true', help="Report from the index without checking the server for new runs")
+    parser.add_argument('--limit', type=int, default=20, help="Maximum number of instances listed per category (default: 20)")
+    parser.add_argument('-j', '--jobs', type=int, default=16, help="Maximum number of concurrent requests when fetching result details (default: 16)")
+    parser.add_argument('-v', '--verbose', default=False, action='store_true')
+    parser.add_argument('benchmark_id', type=int, help="ID of the benchmark")
+    args = parser.parse_args()
+    if args.jobs < 1:
+        print("error: --jobs must be at least 1")
+        sys.exit(1)
+
+    client = Client.from_args(args, pool_size=args.jobs)
+    history = History(os.path.join(args.cache_dir, "history.sqlite"))
+    if not args.no_update:
+        cache = open_cache(args)
+        start = time.monotonic()
+        nIngested, nInProgress = update_history(client, cache, history, args.benchmark_id, not args.no_validations, args.jobs, args.verbose)
+        if cache is not None:
+            cache.close()
+        print(f"Indexed {nIngested} new runs in {time.monotonic() - start:.1f} seconds"
+              + (f"; {nInProgress} runs still in progress" if nInProgress else "") + ".")
+
+    runs = history.runs(client.endpoint, args.benchmark_id)
+    if not runs:
+        print(f"No finished runs on benchmark {args.benchmark_id} are indexed.")
+        sys.exit(1)
+    labels = {run_id: f"{run_id} ({solver}{' ' + arguments if arguments else ''})" for run_id, solver, arguments in runs}
+    run_id = args.run if args.run is not None else runs[-1][0]
+    if run_id not in labels:
+        print(f"error: run {run_id} is not an indexed run on benchmark {args.benchmark_id}")
+        sys.exit(1)
+    print(f"{len(runs)} runs on benchmark {args.benchmark_id} are indexed.")
+    print()
+
+    baseline_id = args.baseline if args.baseline is not None else find_baseline(runs, run_id)
+    if baseline_id is None:
+        print(f"Run {labels[run_id]} has no earlier run of the same solver to compare with.")
+    elif baseline_id not in labels:
+        print(f"error: run {baseline_id} is not an indexed run on benchmark {args.benchmark_id}")
+        sys.exit(1)
+    else:
+        print(f"Run {labels[run_id]} compared with run {labels[baseline_id]}:")
+        changes = history.runtime_changes(client.endpoint, run_id, baseline_id, args.ratio, args.min_runtime * 1000)
+        slower = [f"- {name}: {old * 0.001:.3f} -> {new * 0.001:.3f} seconds ({new / max(old, 1):.1f}x)" for name, old, new in changes if new > old]
+        faster = [f"- {name}: {old * 0.001:.3f} -> {new * 0.001:.3f} seconds ({old / max(new, 1):.1f}x faster)" for name, old, new in reversed(changes) if new < old]
+        print(f"{len(slower)} instances slower by more than {args.ratio:g}x:")
+        print_limited(slower, args.limit)
+        print(f"{len(faster)} instances faster by more than {args.ratio:g}x:")
+        print_limited(faster, args.limit)
+        timeouts = history.new_timeouts(client.endpoint, run_id, baseline_id)
+        print(f"{len(timeouts)} new timeouts:")
+        print_limited([f"- {name}: {result} in {runtime * 0.001:.3f} seconds before" for name, result, runtime in timeouts], args.limit)
+    print()
+
+    flips = history.flips(client.endpoint, run_id)
+    print(f"{len(flips)} instances on which run {run_id} contradicts another run:")
+    print_limited([f"- {name}: {answer} here; {others[0][1]} in {describe_runs([other_run_id for other_run_id, other_answer in others])}"
+                   for name, (answer, others) in flips.items()], args.limit)
+    print()
+
+    recurring = history.recurring_validation_failures(client.endpoint, args.benchmark_id, args.recurring)
+    print(f"{len(recurring)} instances with failed validations in at least {args.recurring} runs:")
+    print_limited([f"- {name}: {count} runs, most recently run {latest}" for name, count, latest in recurring], args.limit)
+    history.close()
+
+if __name__ == '__main__':
+    run_main(main)
@@ -1,24 +1,24 @@
 #!/usr/bin/env python
 
 import argparse
-import requests
 import sys
-import os
 import secrets
 import getpass
+from smtlab_client import Client, add_client_arguments
+from smtlab_trace import run_main
 
 def mkpasswd(length=32):
     return secrets.token_urlsafe(length)
 
 def main():
     parser = argparse.ArgumentParser(description='Change the password of an SMTLab account')
-    parser.add_argument('--endpoint', help="Base URL of API endpoint", default=os.environ['SMTLAB_API_ENDPOINT'])
+    add_client_arguments(parser)
     parser.add_argument('-g', '--generate', default=False, action='store_true', help="Generate a random password (otherwise, prompt for one)")
-    parser.add_argument('username', nargs='?', type=str, default=os.environ['SMTLAB_USERNAME'], help="Username to modify")
+    parser.add_argument('username', nargs='?', type=str, default=None, help="Username to modify (default: the configured user)")
     args = parser.parse_args()
-
-    auth_username = os.environ['SMTLAB_USERNAME']
-    auth_password = os.environ['SMTLAB_PASSWORD']
+    client = Client.from_args(args)
+    if args.username is None:
+        args.username = client.username
 
     print(f"Changing password for SMTLab user {args.username}")
     if args.generate:
@@ -32,12 +32,11 @@ def main():
             else:
                 break
     request_body = {'username': args.username, 'password': new_password}
-    r = requests.post(args.endpoint + "/users/change_password", json=request_body)
-    r.raise_for_status()
+    client.post_json("/users/change_password", request_body)
     print("Password successfully changed. You may need to edit configuration files and environment variables to reflect the updated password.")
     if args.generate:
         print("The generated password is:")
         print(f"{new_password}")
 
 if __name__ == '__main__':
-    main()
+    run_main(main)
@@ -0,0 +1,208 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import os.path
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from run_cache import default_cache_dir
+
+# Cached listings of the server's runs, benchmarks and solvers, and the
+# interactive pickers built on them. Listings fetched less than --listing-ttl
+# seconds ago are reused, so that choosing a run does not download the full
+# history of the server every time.
+
+LISTINGS = ('runs', 'benchmarks', 'solvers')
+
+SINCE_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+def add_picker_arguments(parser):
+    parser.add_argument('--listing-ttl', type=float, default=60.0,
+                        help="With -i, reuse lists of runs, benchmarks and solvers fetched up to this many seconds ago (default: 60)")
+    parser.add_argument('--page-size', type=int, default=20, help="With -i, number of entries listed at a time (default: 20)")
+
+def add_run_filter_arguments(parser):
+    parser.add_argument('--solver', help="With -i, only list runs of the solver with this ID or name, or whose name contains this")
+    parser.add_argument('--benchmark', help="With -i, only list runs on the benchmark with this ID or name, or whose name contains this")
+    parser.add_argument('--since', type=since_argument, help="With -i, only list runs started since then: e.g. 7d, 12h, 2w or 2024-05-01")
+    parser.add_argument('--search', help="With -i, only list runs whose description, arguments, solver or benchmark contain this")
+
+def since_argument(value):
+    m = re.fullmatch(r"(\d+)([mhdw])", value)
+    if m:
+        return datetime.datetime.now() - datetime.timedelta(**{SINCE_UNITS[m.group(2)]: int(m.group(1))})
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is neither a duration like 7d nor a date")
+
+def parse_date(value):
+    # the server's dates as naive local times, or None
+    if not value:
+        return None
+    try:
+        date = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if date.tzinfo is not None:
+        date = date.astimezone().replace(tzinfo=None)
+    return date
+
+def listings_path(endpoint):
+    endpoint_key = hashlib.sha256(endpoint.encode()).hexdigest()[:16]
+    return os.path.join(default_cache_dir(), "listings", "{}.json".format(endpoint_key))
+
+class Listings:
+    def __init__(self, client, ttl=60.0):
+        self.client = client
+        self.ttl = ttl
+        self.path = listings_path(client.endpoint)
+        # {name: {'fetched': time, 'items': [...]}}
+        self.listings = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f_listings:
+                    self.listings = json.load(f_listings)
+            except ValueError:
+                pass
+        self.indexes = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".{}.tmp".format(os.getpid())
+        with open(tmp_path, 'w') as f_listings:
+            json.dump(self.listings, f_listings)
+        os.replace(tmp_path, self.path)
+
+    def load(self, names, refresh=False):
+        # fetches the listings that are missing or older than the TTL, concurrently
+        now = time.time()
+        stale = [name for name in names
+                 if refresh or name not in self.listings or now - self.listings[name]['fetched'] > self.ttl]
+        if not stale:
+            return
+        with ThreadPoolExecutor(max_workers=len(stale)) as executor:
+            items = list(executor.map(lambda name: self.client.get_json("/" + name), stale))
+        for name, listing in zip(stale, items):
+            self.listings[name] = {'fetched': now, 'items': listing}
+            self.indexes.pop(name, None)
+        self.save()
+
+    def invalidate(self, name):
+        if self.listings.pop(name, None) is not None:
+            self.indexes.pop(name, None)
+            self.save()
+
+    def items(self, name):
+        self.load([name])
+        return self.listings[name]['items']
+
+    def by_id(self, name):
+        if name not in self.indexes:
+            self.indexes[name] = {item['id']: item for item in self.items(name)}
+        return self.indexes[name]
+
+    def runs_by(self, key):
+        # {solver or benchmark ID: [runs]}
+        index_name = 'runs_by_' + key
+        if index_name not in self.indexes:
+            index = {}
+            for run in self.items('runs'):
+                index.setdefault(run[key], []).append(run)
+            self.indexes[index_name] = index
+        return self.indexes[index_name]
+
+def matching_ids(items, query):
+    # IDs of the items with this ID, or named query, or failing that whose
+    # name contains query
+    if query.isdigit():
+        return {int(query)}
+    query = query.lower()
+    exact = {item['id'] for item in items if item['name'].lower() == query}
+    return exact or {item['id'] for item in items if query in item['name'].lower()}
+
+def describe_run(run, solvers_by_id, benchmarks_by_id):
+    solver_name = solvers_by_id[run['solver_id']]['name'] if run['solver_id'] in solvers_by_id else "???"
+    benchmark_name = benchmarks_by_id[run['benchmark_id']]['name'] if run['benchmark_id'] in benchmarks_by_id else "???"
+    return f"{run['id']}: {solver_name} / {benchmark_name} : {run['arguments']} ({(run['description'] or '').strip()}) {run['start_date']}"
+
+def filter_runs(listings, solver=None, benchmark=None, since=None, search=None):
+    # returns (run, description) of the matching runs, newest first
+    listings.load(LISTINGS)
+    solvers_by_id = listings.by_id('solvers')
+    benchmarks_by_id = listings.by_id('benchmarks')
+    runs = listings.items('runs')
+    if solver is not None:
+        runs_by_solver = listings.runs_by('solver_id')
+        runs = [run for solver_id in matching_ids(solvers_by_id.values(), solver) for run in runs_by_solver.get(solver_id, [])]
+    if benchmark is not None:
+        benchmark_ids = matching_ids(benchmarks_by_id.values(), benchmark)
+        if solver is None:
+            runs_by_benchmark = listings.runs_by('benchmark_id')
+            runs = [run for benchmark_id in benchmark_ids for run in runs_by_benchmark.get(benchmark_id, [])]
+        else:
+            runs = [run for run in runs if run['benchmark_id'] in benchmark_ids]
+    if since is not None:
+        runs = [run for run in runs if (parse_date(run.get('start_date')) or datetime.datetime.min) >= since]
+    entries = [(run, describe_run(run, solvers_by_id, benchmarks_by_id)) for run in sorted(runs, key=lambda run: -run['id'])]
+    if search is not None:
+        search = search.lower()
+        entries = [(run, description) for run, description in entries if search in description.lower()]
+    return entries
+
+def pick(entries, prompt, page_size, refresh=None):
+    # lists (id, line) entries a page at a time and returns the ID entered;
+    # 'n' and 'p' page through the list and '/text' narrows it to the lines
+    # containing text. An ID that is not listed is looked up again with
+    # refresh(), if given, in case it was created since the list was fetched.
+    shown = entries
+    page = 0
+    show = True
+    while True:
+        if show:
+            for id, line in shown[page * page_size:(page + 1) * page_size]:
+                print(line)
+            if len(shown) > page_size:
+                last = min((page + 1) * page_size, len(shown))
+                print(f"({page * page_size + 1}-{last} of {len(shown)}; n: next page, p: previous page, /text: search)")
+            elif len(shown) < len(entries):
+                print(f"({len(shown)} of {len(entries)}; / to list all)")
+            print("")
+        show = False
+        print(prompt + " ", end="")
+        sys.stdout.flush()
+        line = sys.stdin.readline()
+        if line == "":
+            print()
+            sys.exit(1)
+        response = line.strip()
+        if response in ('n', 'p'):
+            last_page = max(0, (len(shown) - 1) // page_size)
+            page = min(page + 1, last_page) if response == 'n' else max(page - 1, 0)
+            show = True
+            continue
+        if response.startswith('/'):
+            text = response[1:].strip().lower()
+            shown = [entry for entry in entries if text in entry[1].lower()]
+            page = 0
+            show = True
+            if not shown:
+                print(f"Nothing matches '{text}'.")
+                shown = entries
+            continue
+        try:
+            id = int(response)
+        except ValueError:
+            print("Please enter an integer.")
+            continue
+        if any(entry_id == id for entry_id, line in entries):
+            return id
+        if refresh is not None:
+            entries = refresh()
+            shown = entries
+            if any(entry_id == id for entry_id, line in entries):
+                return id
+        print("Invalid ID specified.")
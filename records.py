@@ -0,0 +1,30 @@
+import sys
+
+# Compact forms of the records returned by /benchmarks/{id}/instances and
+# /runs/{id}/results, keeping only the fields the reports use. Large runs
+# hold hundreds of thousands of these, so they use __slots__ instead of
+# per-record dicts, and share one copy of each result string.
+
+class Instance:
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    @classmethod
+    def from_json(cls, instance):
+        return cls(instance['id'], instance['name'])
+
+class Result:
+    __slots__ = ('id', 'instance_id', 'result', 'runtime')
+
+    def __init__(self, id, instance_id, result, runtime):
+        self.id = id
+        self.instance_id = instance_id
+        self.result = sys.intern(result)
+        self.runtime = runtime
+
+    @classmethod
+    def from_json(cls, result):
+        return cls(result['id'], result['instance_id'], result['result'], result['runtime'])
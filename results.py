@@ -1,90 +1,152 @@
 #!/usr/bin/env python
 
 import argparse
-import requests
+import hashlib
 import sys
 import os
+import json
+import random
+import re
+import time
+from pickers import Listings, add_picker_arguments, add_run_filter_arguments, filter_runs, pick
+from records import Instance, Result
+from run_cache import add_cache_arguments, open_cache
+from smtlab_client import Client, add_client_arguments, ordered_map
+from smtlab_trace import run_main
 
-username = os.environ['SMTLAB_USERNAME']
-password = os.environ['SMTLAB_PASSWORD']
-
-def interact_get_run_id(args):
-    # first fetch benchmark names and solver names
-    r = requests.get(args.endpoint + "/benchmarks", auth=(username,password))
-    r.raise_for_status()
-    benchmark_info = r.json()
-    r = requests.get(args.endpoint + "/solvers", auth=(username,password))
-    r.raise_for_status()
-    solver_info = r.json()
-    
-    print("Fetching list of runs from the server.")
-    r = requests.get(args.endpoint + "/runs", auth=(username,password))
-    if r.status_code != requests.codes.ok:
-        print(r.json())
-        r.raise_for_status()
-    run_info = r.json()
-    if len(run_info) == 0:
-        print("There are no runs available on the server!")
-        sys.exit(1)
-    valid_ids = []
-    for run in run_info:
-        benchmark_name = "???"
-        for benchmark in benchmark_info:
-            if benchmark['id'] == run['benchmark_id']:
-                benchmark_name = benchmark['name']
-                break
-        solver_name = "???"
-        for solver in solver_info:
-            if solver['id'] == run['solver_id']:
-                solver_name = solver['name']
-                break
-        print(f"{run['id']}: {solver_name} / {benchmark_name} : {run['arguments']} ({run['description'].strip()}) {run['start_date']}")
-        valid_ids.append(run['id'])
-    print("")
-    while True:
-        print("Show results from which run ID? ", end="")
-        sys.stdout.flush()
-        response = sys.stdin.readline().strip()
-        try:
-            id = int(response)
-            if id in valid_ids:
-                return id
+def fetch_result_details(client, result_ids, jobs):
+    # yields the detailed info for each result ID, in the order given,
+    # with at most 'jobs' requests in flight at a time
+    return ordered_map(lambda result_id: client.get_json(f"/results/{result_id}"), result_ids, jobs)
+
+def index_by(items, key):
+    index = {}
+    for item in items:
+        index[item[key]] = item
+    return index
+
+def name_of(index, id):
+    if id in index:
+        return index[id]['name']
+    return "???"
+
+def check_validations(result_status, validations):
+    nValidationsOK = 0
+    errorValidations = []
+    for validation in validations:
+        if 'result' in validation:
+            if validation['result'] == 'unsat' and result_status == 'sat':
+                errorValidations.append(validation)
             else:
-                print("Invalid ID specified.")
-        except ValueError:
-            print("Please enter an integer.")
-
-def display_run(args, run_id):
-    r = requests.get(args.endpoint + f"/runs/{run_id}", auth=(username,password))
-    r.raise_for_status()
-    run_info = r.json()
-
-    r = requests.get(args.endpoint + f"/benchmarks/{run_info['benchmark_id']}", auth=(username,password))
-    r.raise_for_status()
-    benchmark_info = r.json()
-
-    r = requests.get(args.endpoint + f"/solvers", auth=(username,password))
-    r.raise_for_status()
-    solver_info = r.json()
-
-    r = requests.get(args.endpoint + f"/benchmarks/{run_info['benchmark_id']}/instances", auth=(username,password))
-    r.raise_for_status()
-    benchmark_instances_info = r.json()
-
-    r = requests.get(args.endpoint + f"/runs/{run_id}/results", auth=(username,password))
-    r.raise_for_status()
-    result_info = r.json()
-
-    this_solver_name = "???"
-    for solver in solver_info:
-        if solver['id'] == run_info['solver_id']:
-            this_solver_name = solver['name']
-            break
-    
+                nValidationsOK += 1
+        elif 'validation' in validation:
+            if validation['validation'] == 'invalid':
+                errorValidations.append(validation)
+            else:
+                nValidationsOK += 1
+    return nValidationsOK, errorValidations
+
+def print_result(instance_name, result, detailed_result_info, solvers_by_id):
+    # prints one line of the detailed report; returns True if the result
+    # had validation issues
+    instanceTime = float(result.runtime) * 0.001
+    validations = detailed_result_info['validations']
+    nValidations = len(validations)
+    nValidationsOK, errorValidations = check_validations(result.result, validations)
+    print(f"{instance_name}: {result.result} ({instanceTime:.3f} seconds) ({nValidationsOK}/{nValidations} without error)")
+    if result.result == 'error':
+        print(detailed_result_info['stdout'])
+    for errorValidation in errorValidations:
+        solverName = name_of(solvers_by_id, errorValidation['solver_id'])
+        if 'result' in errorValidation:
+            rText = errorValidation['result']
+        elif 'validation' in errorValidation:
+            rText = errorValidation['validation']
+        print(f"- {solverName}: {rText}")
+    return len(errorValidations) > 0
+
+def interact_get_run_id(args, client):
+    listings = Listings(client, args.listing_ttl)
+    filters = {'solver': args.solver, 'benchmark': args.benchmark, 'since': args.since, 'search': args.search}
+    entries = filter_runs(listings, **filters)
+    if len(entries) == 0:
+        if listings.items('runs'):
+            print("No runs match the given filters.")
+        else:
+            print("There are no runs available on the server!")
+        sys.exit(1)
+
+    def refresh():
+        listings.load(['runs'], refresh=True)
+        return [(run['id'], description) for run, description in filter_runs(listings, **filters)]
+    return pick([(run['id'], description) for run, description in entries], "Show results from which run ID?", args.page_size, refresh)
+
+def fetch_run(client, cache, run_id, store=True):
+    # returns the run, its benchmark and instances, all solvers, and the
+    # run's results; complete runs are read from the cache, and other runs
+    # are written to it unless store is False. Writing a run replaces any
+    # details stored for it, so callers that will not store all of its
+    # details and mark it complete should not store it.
+    if cache is not None:
+        cached = cache.load_run(client.endpoint, run_id)
+        if cached is not None:
+            cached['cached'] = True
+            return cached
+    run_info = client.get_json(f"/runs/{run_id}")
+    benchmark_info = client.get_json(f"/benchmarks/{run_info['benchmark_id']}")
+    solver_info = client.get_json("/solvers")
+    # these lists can be very large, so they are decoded as they arrive
+    # and kept in compact form
+    benchmark_instances_info = [Instance.from_json(instance) for instance in client.get_json_stream(f"/benchmarks/{run_info['benchmark_id']}/instances")]
+    result_info = [Result.from_json(result) for result in client.get_json_stream(f"/runs/{run_id}/results")]
+    if cache is not None and store:
+        cache.store_run(client.endpoint, run_info, benchmark_info, solver_info, benchmark_instances_info, result_info)
+    return {'run': run_info, 'benchmark': benchmark_info, 'solvers': solver_info,
+            'instances': benchmark_instances_info, 'results': result_info, 'cached': False}
+
+def run_argument(value):
+    # a run ID, or the path of a run file written by 'run_solver.py --local'
+    try:
+        return int(value)
+    except ValueError:
+        if not os.path.exists(value):
+            raise argparse.ArgumentTypeError(f"'{value}' is neither a run ID nor a run file")
+        return value
+
+def load_local_run(path):
+    # returns a run file written by 'run_solver.py --local' in the form
+    # returned by fetch_run, plus the details of each result by result ID;
+    # local runs are identified by the path of their file
+    with open(path, "r") as f_run:
+        run = json.load(f_run)
+    run_info = dict(run['run'], id=path)
+    return {'run': run_info, 'benchmark': run['benchmark'], 'solvers': run['solvers'],
+            'instances': [Instance.from_json(instance) for instance in run['instances']],
+            'results': [Result.from_json(result) for result in run['results']],
+            'details': {detail['id']: detail for detail in run['details']},
+            'cached': False, 'local': True}
+
+def display_run(args, client, run_id):
+    if isinstance(run_id, str):
+        cache = None
+        run = load_local_run(run_id)
+    else:
+        cache = open_cache(args)
+        run = fetch_run(client, cache, run_id)
+    cached = run['cached']
+    run_info = run['run']
+    benchmark_info = run['benchmark']
+    solver_info = run['solvers']
+    benchmark_instances_info = run['instances']
+    result_info = run['results']
+
+    solvers_by_id = index_by(solver_info, 'id')
+    this_solver_name = name_of(solvers_by_id, run_info['solver_id'])
+
     print(f"Run {run_info['id']}: {this_solver_name} / {benchmark_info['name']}")
     print(f"{len(result_info)} results / {len(benchmark_instances_info)} instances in this benchmark")
 
-    # collect summary
+    # collect summary and index results by instance in a single pass
     nSAT = 0
     nUNSAT = 0
     nTIMEOUT = 0
@@ -94,20 +156,23 @@ def display_run(args, run_id):
     totalRunTime_ms = 0
     totalRunTime_withoutTimeouts_ms = 0
 
+    results_by_instance = {}
     for result in result_info:
-        totalRunTime_ms += result['runtime']
-        if result['result'] != 'timeout':
-            totalRunTime_withoutTimeouts_ms += result['runtime']
+        results_by_instance.setdefault(result.instance_id, []).append(result)
+
+        totalRunTime_ms += result.runtime
+        if result.result != 'timeout':
+            totalRunTime_withoutTimeouts_ms += result.runtime
 
-        if result['result'] == 'sat':
+        if result.result == 'sat':
             nSAT += 1
-        elif result['result'] == 'unsat':
+        elif result.result == 'unsat':
             nUNSAT += 1
-        elif result['result'] == 'timeout':
+        elif result.result == 'timeout':
             nTIMEOUT += 1
-        elif result['result'] == 'unknown':
+        elif result.result == 'unknown':
             nUNKNOWN += 1
-        elif result['result'] == 'error':
+        elif result.result == 'error':
             nERROR += 1
 
     totalRunTime = float(totalRunTime_ms) * 0.001
@@ -120,57 +185,275 @@ def display_run(args, run_id):
     print()
 
     nValidationIssues = 0
-    
+
+    # pair up each instance with its results, in benchmark order,
+    # then fetch the details of all of them concurrently
+    instance_results = []
     for instance in benchmark_instances_info:
-        for result in result_info:
-            if result['instance_id'] == instance['id']:
-                instanceTime = float(result['runtime']) * 0.001
-                r = requests.get(args.endpoint + f"/results/{result['id']}", auth=(username,password))
-                r.raise_for_status()
-                detailed_result_info = r.json()
-                validations = detailed_result_info['validations']
-                nValidations = len(validations)
-                nValidationsOK = 0
-                errorValidations = []
-                for validation in validations:
-                    if 'result' in validation:
-                        if validation['result'] == 'unsat' and result['result'] == 'sat':
-                            errorValidations.append(validation)
-                        else:
-                            nValidationsOK += 1
-                    elif 'validation' in validation:
-                        if validation['validation'] == 'invalid':
-                            errorValidations.append(validation)
-                        else:
-                            nValidationsOK += 1
-                print(f"{instance['name']}: {result['result']} ({instanceTime:.3f} seconds) ({nValidationsOK}/{nValidations} without error)")
-                if result['result'] == 'error':
-                    print(detailed_result_info['stdout'])
-                if errorValidations:
-                    nValidationIssues += 1
-                    for errorValidation in errorValidations:
-                        for solver in solver_info:
-                            if errorValidation['solver_id'] == solver['id']:
-                                solverName = solver['name']
-                                break
-                        if 'result' in errorValidation:
-                            rText = errorValidation['result']
-                        elif 'validation' in errorValidation:
-                            rText = errorValidation['validation']
-                        print(f"- {solverName}: {rText}")
+        for result in results_by_instance.get(instance.id, []):
+            instance_results.append((instance, result))
+    result_ids = [result.id for instance, result in instance_results]
+    if run.get('local'):
+        details = (run['details'][result_id] for result_id in result_ids)
+    elif cached:
+        details = cache.iter_details(client.endpoint, run_id, result_ids)
+    else:
+        details = fetch_result_details(client, result_ids, args.jobs)
+        if cache is not None:
+            details = cache.store_details(client.endpoint, run_id, zip(result_ids, details))
+
+    # details first, so that zip exhausts it and the cache writes its last batch
+    for detailed_result_info, (instance, result) in zip(details, instance_results):
+        if print_result(instance.name, result, detailed_result_info, solvers_by_id):
+            nValidationIssues += 1
 
     print()
     print(f"{nValidationIssues} instances had validation issues.")
 
+    if cache is not None:
+        if not cached:
+            cache.mark_complete(client.endpoint, run_id)
+        cache.evict()
+        cache.close()
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+def watch_run(args, client, run_id):
+    # polls the results of a run that is in progress, reporting only the
+    # results that arrived since the previous poll
+    run_info = client.get_json(f"/runs/{run_id}")
+    benchmark_info = client.get_json(f"/benchmarks/{run_info['benchmark_id']}")
+    solvers_by_id = index_by(client.get_json("/solvers"), 'id')
+    instance_names = {}
+    for instance in client.get_json_stream(f"/benchmarks/{run_info['benchmark_id']}/instances"):
+        instance_names[instance['id']] = instance['name']
+    nInstances = len(instance_names)
+    print(f"Watching run {run_info['id']}: {name_of(solvers_by_id, run_info['solver_id'])} / {benchmark_info['name']} ({nInstances} instances)")
+
+    counts = {'sat': 0, 'unsat': 0, 'timeout': 0, 'unknown': 0, 'error': 0}
+    seen = set()
+    nValidationIssues = 0
+    nAtStart = None
+    startTime = time.monotonic()
+    # the API cannot list only the results added since the last poll, so
+    # each poll downloads the run's whole list of results again, unless the
+    # server confirms through its ETag or Last-Modified that it is unchanged;
+    # only the details of new results are fetched
+    validators = {}
+    while True:
+        new_results = [Result.from_json(result) for result in client.get_json_stream(f"/runs/{run_id}/results", validators=validators)
+                       if result['id'] not in seen]
+        for result in new_results:
+            seen.add(result.id)
+            counts[result.result] = counts.get(result.result, 0) + 1
+        if nAtStart is None:
+            nAtStart = len(seen)
+
+        # only errors, and sat/unsat answers when checking validations, need details
+        interesting = [result for result in new_results
+                       if result.result == 'error' or (args.check_validations and result.result in ('sat', 'unsat'))]
+        details = fetch_result_details(client, [result.id for result in interesting], args.jobs)
+        for result, detailed_result_info in zip(interesting, details):
+            if result.result != 'error':
+                nValidationsOK, errorValidations = check_validations(result.result, detailed_result_info['validations'])
+                if not errorValidations:
+                    continue
+            if print_result(instance_names.get(result.instance_id, "???"), result, detailed_result_info, solvers_by_id):
+                nValidationIssues += 1
+
+        elapsed = time.monotonic() - startTime
+        rate = (len(seen) - nAtStart) / elapsed if elapsed > 0 else 0.0
+        remaining = max(nInstances - len(seen), 0)
+        eta = format_duration(remaining / rate) if rate > 0 else "unknown"
+        print(f"[{time.strftime('%H:%M:%S')}] {len(seen)}/{nInstances} results "
+              f"SAT: {counts['sat']} UNSAT: {counts['unsat']} TIMEOUT: {counts['timeout']} UNKNOWN: {counts['unknown']} ERROR: {counts['error']} "
+              f"({rate * 60:.1f} results/minute, ETA {eta})")
+        sys.stdout.flush()
+        if remaining == 0:
+            break
+        time.sleep(args.interval)
+
+    if args.check_validations:
+        print(f"{nValidationIssues} instances had validation issues.")
+
+# replaced in error output before fingerprinting, so that failures that
+# differ only in paths, addresses, line numbers and the like are grouped
+NORMALIZATIONS = [
+    (re.compile(r"0x[0-9a-fA-F]+"), "0x?"),
+    (re.compile(r"(?:[\w.+-]*/)+([\w.+-]+)"), r"\1"),
+    (re.compile(r"\b[0-9a-fA-F]{8,}\b"), "?"),
+    (re.compile(r"\d+"), "N"),
+    (re.compile(r"[ \t]+"), " "),
+]
+
+# output lines shown for the representative of each group
+TRIAGE_LINES = 20
+
+def normalize_output(stdout):
+    text = stdout or ""
+    for pattern, replacement in NORMALIZATIONS:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+def fingerprint(stdout):
+    return hashlib.sha1(normalize_output(stdout).encode()).hexdigest()[:12]
+
+def triage_key(result, detailed_result_info, solvers_by_id):
+    # the group of a failure, or None for a sat/unsat result without
+    # validation issues
+    if result.result == 'error':
+        return ('error', fingerprint(detailed_result_info['stdout']))
+    nValidationsOK, errorValidations = check_validations(result.result, detailed_result_info['validations'])
+    if not errorValidations:
+        return None
+    complaints = set()
+    for errorValidation in errorValidations:
+        rText = errorValidation['result'] if 'result' in errorValidation else errorValidation['validation']
+        complaints.add(f"{name_of(solvers_by_id, errorValidation['solver_id'])}: {rText}")
+    return ('validation', result.result + " / " + ", ".join(sorted(complaints)))
+
+def triage_run(args, client, run_id):
+    # groups the errors of a run by the normalized output of the solver and,
+    # with --check-validations, the validation issues by what the
+    # validators said. Errors are fetched in random order; as the group of
+    # an error is only known once its details are fetched, fetching stops
+    # when every group seen has --sample errors and no new group turned up
+    # in the last 10 * --sample errors, and the sizes of the groups are then
+    # estimated. Validation issues can only be found by fetching the
+    # details, so all sat/unsat results are fetched.
+    if isinstance(run_id, str):
+        cache = None
+        run = load_local_run(run_id)
+    else:
+        cache = open_cache(args)
+        # triage fetches only some details, so the run is not cached
+        run = fetch_run(client, cache, run_id, store=False)
+    run_info = run['run']
+    solvers_by_id = index_by(run['solvers'], 'id')
+    instance_names = {instance.id: instance.name for instance in run['instances']}
+    print(f"Triage of run {run_info['id']}: {name_of(solvers_by_id, run_info['solver_id'])} / {run['benchmark']['name']}")
+
+    def fetch(results):
+        result_ids = [result.id for result in results]
+        if run.get('local'):
+            return (run['details'][result_id] for result_id in result_ids)
+        if run['cached']:
+            return cache.iter_details(client.endpoint, run_id, result_ids)
+        return fetch_result_details(client, result_ids, args.jobs)
+
+    # {key: {'count', 'instances', 'stdout'}}
+    groups = {}
+    def add(key, result, detailed_result_info):
+        if key not in groups:
+            groups[key] = {'count': 0, 'instances': [], 'stdout': detailed_result_info['stdout']}
+        group = groups[key]
+        group['count'] += 1
+        if len(group['instances']) < 3:
+            group['instances'].append(instance_names.get(result.instance_id, "???"))
+
+    errors = [result for result in run['results'] if result.result == 'error']
+    # a random order, so that stopping early leaves a representative sample
+    random.Random(0).shuffle(errors)
+    # details that are already at hand cost nothing to read
+    sampling = args.sample > 0 and not run.get('local') and not run['cached']
+    nFetched = 0
+    sinceNewGroup = 0
+    details = fetch(errors)
+    for result, detailed_result_info in zip(errors, details):
+        nFetched += 1
+        key = triage_key(result, detailed_result_info, solvers_by_id)
+        sinceNewGroup = 0 if key not in groups else sinceNewGroup + 1
+        add(key, result, detailed_result_info)
+        if (sampling and sinceNewGroup >= 10 * args.sample
+                and all(group['count'] >= args.sample for group in groups.values())):
+            break
+    if hasattr(details, 'close'):
+        # waits only for the fetches already in flight
+        details.close()
+    # scales the sizes of the error groups from the errors fetched
+    scale = len(errors) / nFetched if nFetched else 1.0
+
+    answers = [result for result in run['results'] if result.result in ('sat', 'unsat')] if args.check_validations else []
+    nClean = 0
+    for result, detailed_result_info in zip(answers, fetch(answers)):
+        key = triage_key(result, detailed_result_info, solvers_by_id)
+        if key is None:
+            nClean += 1
+        else:
+            add(key, result, detailed_result_info)
+    if cache is not None:
+        cache.close()
+
+    print(f"{len(errors)} errors" + (f", {len(answers)} sat/unsat results checked for validation issues" if args.check_validations else ""))
+    estimated = nFetched < len(errors)
+    if estimated:
+        print(f"Fetched the details of {nFetched} of {len(errors)} errors; the sizes of the error groups are estimates, "
+              f"and groups of fewer than about 1 in {10 * args.sample} errors may be missing (use --sample 0 to fetch all)")
+    if args.check_validations:
+        print(f"{nClean} sat/unsat results had no validation issues")
+    print()
+
+    ordered = sorted(groups.items(), key=lambda item: (-item[1]['count'] * (scale if item[0][0] == 'error' else 1.0), item[0]))
+    for n, ((kind, label), group) in enumerate(ordered, 1):
+        approx = "~" if estimated and kind == 'error' else ""
+        count = max(round(group['count'] * scale), group['count']) if kind == 'error' else group['count']
+        if kind == 'error':
+            print(f"Group {n}: {approx}{count} errors [{label}]")
+        else:
+            print(f"Group {n}: {count} results with validation issues [{label}]")
+        examples = group['instances']
+        more = f" and {approx}{count - len(examples)} more" if count > len(examples) else ""
+        print("  e.g. " + ", ".join(examples) + more)
+        if kind == 'error':
+            lines = (group['stdout'] or "").strip().splitlines()
+            for line in lines[:TRIAGE_LINES]:
+                print("  | " + line)
+            if len(lines) > TRIAGE_LINES:
+                print(f"  | ... ({len(lines) - TRIAGE_LINES} more lines)")
+        print()
+    print(f"{len(groups)} groups.")
+
 def main():
     parser = argparse.ArgumentParser(description="Get results of SMTLab benchmark runs")
-    parser.add_argument('--endpoint', help="Base URL of API endpoint", default=os.environ['SMTLAB_API_ENDPOINT'])
+    add_client_arguments(parser)
     parser.add_argument('-i', '--interactive', default=False, action="store_true", help="Display results interactively")
-    parser.add_argument("run_id", nargs='?', type=int, default=-1)
+    parser.add_argument('-v', '--verbose', default=False, action='store_true', help="Report the bytes transferred and saved by compression")
+    parser.add_argument('-j', '--jobs', type=int, default=16, help="Maximum number of concurrent requests when fetching result details (default: 16)")
+    add_cache_arguments(parser)
+    parser.add_argument('-w', '--watch', default=False, action='store_true', help="Follow a run in progress, reporting new results as they arrive")
+    parser.add_argument('--interval', type=float, default=30.0, help="Seconds between polls in --watch mode (default: 30)")
+    parser.add_argument('--check-validations', default=False, action='store_true', help="In --watch and --triage modes, also fetch sat/unsat results to report validation issues")
+    parser.add_argument('-t', '--triage', default=False, action='store_true', help="Group the errors of a run by their normalized output, and with --check-validations its validation issues, instead of listing every result")
+    parser.add_argument('--sample', type=int, default=20, help="In --triage mode, stop fetching errors once every group has this many and no new group is turning up; 0 fetches all (default: 20)")
+    add_picker_arguments(parser)
+    add_run_filter_arguments(parser)
+    parser.add_argument("run_id", nargs='?', type=run_argument, default=-1, help="ID of the run, or a run file written by 'run_solver.py --local'")
 
     args = parser.parse_args()
+    if args.jobs < 1:
+        print("error: --jobs must be at least 1")
+        sys.exit(1)
+    if args.sample < 0:
+        print("error: --sample must not be negative")
+        sys.exit(1)
+    if args.watch and args.triage:
+        print("error: '--watch' and '--triage' cannot be used together")
+        sys.exit(1)
+    if isinstance(args.run_id, str):
+        if args.interactive or args.watch:
+            print("error: a local run file cannot be used with '--interactive' or '--watch'")
+            sys.exit(1)
+        if args.triage:
+            triage_run(args, None, args.run_id)
+        else:
+            display_run(args, None, args.run_id)
+        return
+    client = Client.from_args(args, pool_size=args.jobs)
     if args.interactive:
-        run_id = interact_get_run_id(args)
+        run_id = interact_get_run_id(args, client)
     else:
         if args.run_id < 0:
             print("error: run ID or '--interactive' must be specified")
@@ -178,7 +461,14 @@ def main():
         else:
             run_id = args.run_id
 
-    display_run(args, run_id)
+    if args.watch:
+        watch_run(args, client, run_id)
+    elif args.triage:
+        triage_run(args, client, run_id)
+    else:
+        display_run(args, client, run_id)
+    if args.verbose:
+        print(client.transfer_summary())
 
 if __name__ == '__main__':
-    main()
+    run_main(main)
@@ -0,0 +1,162 @@
+import json
+import os
+import os.path
+import sqlite3
+import time
+from records import Instance, Result
+
+# Local store of completed runs, so that viewing the results of a run
+# that has already been downloaded once does not touch the server.
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'smtlab')
+
+def add_cache_arguments(parser):
+    parser.add_argument('--no-cache', default=False, action='store_true', help="Always fetch results from the server instead of the local cache")
+    parser.add_argument('--cache-dir', default=default_cache_dir(), help="Directory of the local results cache (default: %(default)s)")
+    parser.add_argument('--cache-size', type=int, default=1024, help="Maximum size of the local results cache in MB (default: 1024)")
+
+def open_cache(args):
+    if args.no_cache:
+        return None
+    return RunCache(os.path.join(args.cache_dir, "runs.sqlite"), args.cache_size * 1024 * 1024)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    endpoint TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    benchmark_id INTEGER NOT NULL,
+    run TEXT NOT NULL,
+    benchmark TEXT NOT NULL,
+    solvers TEXT NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 0,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (endpoint, run_id)
+);
+CREATE TABLE IF NOT EXISTS instances (
+    endpoint TEXT NOT NULL,
+    benchmark_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    instance_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (endpoint, benchmark_id, position)
+);
+CREATE TABLE IF NOT EXISTS results (
+    endpoint TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    result_id INTEGER NOT NULL,
+    instance_id INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    runtime INTEGER NOT NULL,
+    detail TEXT,
+    PRIMARY KEY (endpoint, run_id, result_id)
+);
+CREATE INDEX IF NOT EXISTS results_by_instance ON results (endpoint, run_id, instance_id);
+"""
+
+class RunCache:
+    def __init__(self, path, max_bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path)
+        # must be set before the first table is created to take effect
+        self.db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def load_run(self, endpoint, run_id):
+        # only runs that were marked complete are served from the cache
+        row = self.db.execute("SELECT benchmark_id, run, benchmark, solvers FROM runs WHERE endpoint = ? AND run_id = ? AND complete = 1",
+                              (endpoint, run_id)).fetchone()
+        if row is None:
+            return None
+        benchmark_id, run, benchmark, solvers = row
+        instances = [Instance(instance_id, name) for instance_id, name in self.db.execute(
+            "SELECT instance_id, name FROM instances WHERE endpoint = ? AND benchmark_id = ? ORDER BY position",
+            (endpoint, benchmark_id))]
+        results = [Result(result_id, instance_id, result, runtime)
+                   for result_id, instance_id, result, runtime in self.db.execute(
+                       "SELECT result_id, instance_id, result, runtime FROM results WHERE endpoint = ? AND run_id = ? ORDER BY result_id",
+                       (endpoint, run_id))]
+        with self.db:
+            self.db.execute("UPDATE runs SET accessed = ? WHERE endpoint = ? AND run_id = ?", (time.time(), endpoint, run_id))
+        return {'run': json.loads(run), 'benchmark': json.loads(benchmark), 'solvers': json.loads(solvers),
+                'instances': instances, 'results': results}
+
+    def iter_details(self, endpoint, run_id, result_ids):
+        for result_id in result_ids:
+            row = self.db.execute("SELECT detail FROM results WHERE endpoint = ? AND run_id = ? AND result_id = ?",
+                                  (endpoint, run_id, result_id)).fetchone()
+            yield json.loads(row[0])
+
+    def store_run(self, endpoint, run_info, benchmark_info, solver_info, instances, results):
+        benchmark_id = run_info['benchmark_id']
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO runs (endpoint, run_id, benchmark_id, run, benchmark, solvers, complete, accessed) VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                            (endpoint, run_info['id'], benchmark_id, json.dumps(run_info), json.dumps(benchmark_info), json.dumps(solver_info), time.time()))
+            self.db.execute("DELETE FROM instances WHERE endpoint = ? AND benchmark_id = ?", (endpoint, benchmark_id))
+            self.db.executemany("INSERT INTO instances (endpoint, benchmark_id, position, instance_id, name) VALUES (?, ?, ?, ?, ?)",
+                                ((endpoint, benchmark_id, position, instance.id, instance.name) for position, instance in enumerate(instances)))
+            self.db.execute("DELETE FROM results WHERE endpoint = ? AND run_id = ?", (endpoint, run_info['id']))
+            self.db.executemany("INSERT INTO results (endpoint, run_id, result_id, instance_id, result, runtime) VALUES (?, ?, ?, ?, ?, ?)",
+                                ((endpoint, run_info['id'], result.id, result.instance_id, result.result, result.runtime) for result in results))
+
+    def store_details(self, endpoint, run_id, pairs, batch_size=1000):
+        # passes the details through unchanged, writing them out in batches;
+        # the last batch is written once the generator is exhausted or closed
+        batch = []
+        try:
+            for result_id, detail in pairs:
+                batch.append((json.dumps(detail), endpoint, run_id, result_id))
+                if len(batch) >= batch_size:
+                    self._write_details(batch)
+                    batch = []
+                yield detail
+        finally:
+            if batch:
+                self._write_details(batch)
+
+    def _write_details(self, batch):
+        with self.db:
+            self.db.executemany("UPDATE results SET detail = ? WHERE endpoint = ? AND run_id = ? AND result_id = ?", batch)
+
+    def mark_complete(self, endpoint, run_id):
+        # a run is complete once every instance of its benchmark has a result
+        # and the details of every result have been stored
+        row = self.db.execute("SELECT benchmark_id FROM runs WHERE endpoint = ? AND run_id = ?", (endpoint, run_id)).fetchone()
+        if row is None:
+            return False
+        benchmark_id = row[0]
+        missing_results, = self.db.execute(
+            "SELECT COUNT(*) FROM instances i WHERE i.endpoint = ? AND i.benchmark_id = ? AND NOT EXISTS "
+            "(SELECT 1 FROM results r WHERE r.endpoint = i.endpoint AND r.run_id = ? AND r.instance_id = i.instance_id)",
+            (endpoint, benchmark_id, run_id)).fetchone()
+        missing_details, = self.db.execute("SELECT COUNT(*) FROM results WHERE endpoint = ? AND run_id = ? AND detail IS NULL",
+                                           (endpoint, run_id)).fetchone()
+        if missing_results > 0 or missing_details > 0:
+            return False
+        with self.db:
+            self.db.execute("UPDATE runs SET complete = 1 WHERE endpoint = ? AND run_id = ?", (endpoint, run_id))
+        return True
+
+    def size(self):
+        page_count, = self.db.execute("PRAGMA page_count").fetchone()
+        freelist_count, = self.db.execute("PRAGMA freelist_count").fetchone()
+        page_size, = self.db.execute("PRAGMA page_size").fetchone()
+        return (page_count - freelist_count) * page_size
+
+    def evict(self):
+        # drop least recently viewed runs until the cache fits in max_bytes
+        while self.size() > self.max_bytes:
+            row = self.db.execute("SELECT endpoint, run_id FROM runs ORDER BY accessed LIMIT 1").fetchone()
+            if row is None:
+                break
+            with self.db:
+                self.db.execute("DELETE FROM results WHERE endpoint = ? AND run_id = ?", row)
+                self.db.execute("DELETE FROM runs WHERE endpoint = ? AND run_id = ?", row)
+                self.db.execute("DELETE FROM instances WHERE NOT EXISTS "
+                                "(SELECT 1 FROM runs WHERE runs.endpoint = instances.endpoint AND runs.benchmark_id = instances.benchmark_id)")
+        self.db.execute("PRAGMA incremental_vacuum")
@@ -1,13 +1,23 @@
 #!/usr/bin/env python
 
 import argparse
-import requests
 import sys
 import os
 import json
+import itertools
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from smtlab_client import Client, add_client_arguments, load_config
+from smtlab_trace import run_main
+from pickers import Listings, add_picker_arguments, pick
+from upload_benchmark import find_manifest, walk_instances
+from upload_solver import file_sha256, load_uploads, uploads_path
 
-username = os.environ["SMTLAB_USERNAME"]
-password = os.environ["SMTLAB_PASSWORD"]
+LOCAL_ANSWERS = ('sat', 'unsat', 'unknown')
 
 def prompt_yes_or_no(prompt):
     while True:
@@ -21,7 +31,36 @@ def prompt_yes_or_no(prompt):
         else:
             print("Please answer 'yes' or 'no'.")
 
-def interact(args):
+def prompt_arguments():
+    # returns the custom arguments entered, or None for the solver's defaults
+    custom_arguments = prompt_yes_or_no("Do you want to pass custom arguments to the solver? (If not, the default arguments for this solver will be used.)")
+    if not custom_arguments:
+        return None
+    custom_args = []
+    while True:
+        print(f"Enter arguments, one per line, or a blank line to stop {custom_args}: ", end="")
+        sys.stdout.flush()
+        response = sys.stdin.readline().strip()
+        if response == "":
+            break
+        else:
+            custom_args.append(response)
+    return custom_args
+
+def pick_listed(listings, name, prompt, page_size):
+    def entries():
+        return [(item['id'], f"{item['id']}: {item['name']}") for item in listings.items(name)]
+    listed = entries()
+    if len(listed) == 0:
+        print(f"There are no {name} available on the server!")
+        sys.exit(1)
+
+    def refresh():
+        listings.load([name], refresh=True)
+        return entries()
+    return pick(listed, prompt, page_size, refresh)
+
+def interact(args, client):
     # run_parameters must contain:
     # - benchmark_id
     # - solver_id
@@ -30,112 +69,349 @@ def interact(args):
     # - arguments
     # - description
     run_parameters = {}
+    listings = Listings(client, args.listing_ttl)
     if args.benchmark:
         run_parameters['benchmark_id'] = args.benchmark
     else:
-        print("Fetching list of benchmarks from the server.")
-        r = requests.get(args.endpoint + "/benchmarks", auth=(username,password))
-        if r.status_code != requests.codes.ok:
-            print(r.json())
-            r.raise_for_status()
-        response = r.json()
-        if len(response) == 0:
-            print("There are no benchmarks available on the server!")
-            sys.exit(1)
-        valid_ids = []
-        for benchmark in response:
-            print(f"{benchmark['id']}: {benchmark['name']}")
-            valid_ids.append(benchmark['id'])
-        print("")
-        while True:
-            print("Run which benchmark ID? ", end="")
-            sys.stdout.flush()
-            response = sys.stdin.readline().strip()
-            try:
-                id = int(response)
-                if id in valid_ids:
-                    run_parameters['benchmark_id'] = id
-                    break
-                else:
-                    print("Invalid ID specified.")
-            except ValueError:
-                print("Please enter an integer.")
+        run_parameters['benchmark_id'] = pick_listed(listings, 'benchmarks', "Run which benchmark ID?", args.page_size)
 
     if args.solver:
         run_parameters['solver_id'] = args.solver
     else:
-        print("Fetching list of solvers from the server.")
-        r = requests.get(args.endpoint + "/solvers", auth=(username,password))
-        if r.status_code != requests.codes.ok:
-            print(r.json())
-            r.raise_for_status()
-        response = r.json()
-        if len(response) == 0:
-            print("There are no solvers available on the server!")
-            sys.exit(1)
-        valid_ids = []
-        for solver in response:
-            print(f"{solver['id']}: {solver['name']}")
-            valid_ids.append(solver['id'])
-        print("")
-        while True:
-            print("Run which solver ID? ", end="")
-            sys.stdout.flush()
-            response = sys.stdin.readline().strip()
-            try:
-                id = int(response)
-                if id in valid_ids:
-                    run_parameters['solver_id'] = id
-                    break
-                else:
-                    print("Invalid ID specified.")
-            except ValueError:
-                print("Please enter an integer.")
+        run_parameters['solver_id'] = pick_listed(listings, 'solvers', "Run which solver ID?", args.page_size)
 
     run_parameters['performance'] = args.performance
     run_parameters
 
-    custom_arguments = prompt_yes_or_no("Do you want to pass custom arguments to the solver? (If not, the default arguments for this solver will be used.)")
-    if custom_arguments:
-        custom_args = []
-        while True:
-            print(f"Enter arguments, one per line, or a blank line to stop {custom_args}: ", end="")
-            sys.stdout.flush()
-            response = sys.stdin.readline().strip()
-            if response == "":
-                break
-            else:
-                custom_args.append(response)
+    custom_args = prompt_arguments()
+    if custom_args is not None:
         run_parameters['arguments'] = json.dumps(custom_args)
-    
+
     print("Enter an optional description for this run: ", end="")
     sys.stdout.flush()
     run_parameters['description'] = sys.stdin.readline().strip()
 
     return run_parameters
 
+def load_spec(path):
+    # a run spec is a JSON (or, if PyYAML is installed, YAML) object, or a
+    # list of objects, each of the form
+    #   {"solvers": [12, "z3-nightly"], "benchmarks": [3, "QF_S"],
+    #    "arguments": [null, ["-T:300"]], "performance": [false, true],
+    #    "description": "nightly regression"}
+    # where every combination of solver, benchmark, arguments and mode is run;
+    # null arguments use the solver's defaults, and [] runs the solver
+    # without arguments
+    with open(path, "r") as f_spec:
+        if path.endswith(".yaml") or path.endswith(".yml"):
+            import yaml
+            spec = yaml.safe_load(f_spec)
+        else:
+            spec = json.load(f_spec)
+    if isinstance(spec, dict):
+        spec = [spec]
+    return spec
+
+def as_list(value):
+    if isinstance(value, list):
+        return value
+    return [value]
+
+def resolve_ids(names_or_ids, listing, kind):
+    # names are resolved to the most recently created entry with that name
+    ids_by_name = {}
+    for item in listing:
+        if item['name'] not in ids_by_name or item['id'] > ids_by_name[item['name']]:
+            ids_by_name[item['name']] = item['id']
+    valid_ids = set(item['id'] for item in listing)
+    ids = []
+    for name_or_id in names_or_ids:
+        if isinstance(name_or_id, int):
+            if name_or_id not in valid_ids:
+                print(f"error: no {kind} with ID {name_or_id}")
+                sys.exit(1)
+            ids.append(name_or_id)
+        elif name_or_id in ids_by_name:
+            ids.append(ids_by_name[name_or_id])
+        else:
+            print(f"error: no {kind} named '{name_or_id}'")
+            sys.exit(1)
+    return ids
+
+def is_argument_list(arguments):
+    return isinstance(arguments, list) and all(isinstance(a, str) for a in arguments)
+
+def argument_sets_of(arguments):
+    # the argument sets of a spec entry's 'arguments': null or a single list
+    # of strings ([] is an empty argument list), or a list of nulls and
+    # lists of strings; None if it is none of these
+    if arguments is None or is_argument_list(arguments):
+        return [arguments]
+    if isinstance(arguments, list) and all(a is None or is_argument_list(a) for a in arguments):
+        return arguments
+    return None
+
+def expand_spec(spec, solver_info, benchmark_info):
+    all_run_parameters = []
+    for n, entry in enumerate(spec, 1):
+        if not isinstance(entry, dict):
+            print(f"error: entry {n} of the spec is not an object")
+            sys.exit(1)
+        for key in ('solvers', 'benchmarks'):
+            if key not in entry:
+                print(f"error: entry {n} of the spec has no '{key}'")
+                sys.exit(1)
+        solver_ids = resolve_ids(as_list(entry['solvers']), solver_info, "solver")
+        benchmark_ids = resolve_ids(as_list(entry['benchmarks']), benchmark_info, "benchmark")
+        argument_sets = argument_sets_of(entry.get('arguments', [None]))
+        if argument_sets is None:
+            print(f"error: 'arguments' of entry {n} of the spec must be null, a list of strings, or a list of those")
+            sys.exit(1)
+        performance_modes = as_list(entry.get('performance', False))
+        combinations = list(itertools.product(solver_ids, benchmark_ids, argument_sets, performance_modes))
+        if not combinations:
+            print(f"error: entry {n} of the spec expands to no runs; its solvers, benchmarks and performance must not be empty")
+            sys.exit(1)
+        for solver_id, benchmark_id, arguments, performance in combinations:
+            run_parameters = {'benchmark_id': benchmark_id, 'solver_id': solver_id, 'performance': bool(performance),
+                              'description': entry.get('description', "")}
+            if arguments is not None:
+                run_parameters['arguments'] = json.dumps(arguments)
+            all_run_parameters.append(run_parameters)
+    if not all_run_parameters:
+        print("error: the spec lists no runs")
+        sys.exit(1)
+    return all_run_parameters
+
+def submit_runs(client, all_run_parameters, jobs):
+    # POSTs all runs concurrently; returns the manifest of created runs
+    def submit(run_parameters):
+        try:
+            return dict(run_parameters, id=client.post_json("/runs", run_parameters)['id'])
+        except Exception as e:
+            return dict(run_parameters, id=None, error=str(e))
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(submit, all_run_parameters))
+
+def local_instances(args):
+    # returns the benchmark info and the (name, path) of each instance for
+    # --local: either the .smt2 files under --instances, or the files of a
+    # benchmark uploaded from this machine, from its upload manifest
+    if args.instances:
+        root = os.path.abspath(args.instances)
+        instances = sorted((name, path) for name, path in walk_instances(root) if name.endswith(".smt2"))
+        return {'id': None, 'name': os.path.basename(root)}, instances
+    manifest_file = find_manifest(args.benchmark, args.endpoint or load_config().get('endpoint'))
+    if manifest_file is None:
+        print(f"error: benchmark {args.benchmark} was not uploaded from this machine; use '--instances' to give its directory")
+        sys.exit(1)
+    with open(manifest_file, "r") as f_manifest:
+        manifest = json.load(f_manifest)
+    root = manifest['root']
+    if not os.path.isdir(root):
+        print(f"error: benchmark {args.benchmark} was uploaded from {root}, which no longer exists")
+        sys.exit(1)
+    instances = [(name, os.path.join(root, name)) for name in sorted(manifest['files'])]
+    return {'id': args.benchmark, 'name': os.path.basename(root)}, instances
+
+def default_solver_arguments(path):
+    # the default arguments recorded when this binary was uploaded, if it was
+    sha256 = file_sha256(path)
+    for solvers in load_uploads(uploads_path()).values():
+        for record in solvers.values():
+            if record['sha256'] == sha256 and record.get('default_arguments'):
+                return shlex.split(record['default_arguments'])
+    return []
+
+def solver_command(solver, arguments, memory_limit):
+    command = [os.path.abspath(solver)] + arguments
+    if memory_limit is not None:
+        # the shell execs the solver, which inherits the address space limit
+        command = ["/bin/sh", "-c", f'ulimit -v {memory_limit * 1024} && exec "$@"', "sh"] + command
+    return command
+
+def parse_answer(stdout):
+    # the first non-empty line of the solver's output is its answer
+    for line in stdout.splitlines():
+        line = line.strip()
+        if line:
+            return line if line in LOCAL_ANSWERS else 'error'
+    return 'error'
+
+def kill_process_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def run_local(command, paths, time_limit, jobs):
+    # runs command + [path] for every path, with at most 'jobs' solvers at a
+    # time; yields (index, result, runtime in ms, output) as they finish.
+    # Each solver runs in its own process group, so that it can be killed
+    # together with any children at the time limit or on an interrupt.
+    processes = set()
+    lock = threading.Lock()
+    stopping = [False]
+
+    def run(path):
+        with lock:
+            if stopping[0]:
+                return None
+            start = time.perf_counter()
+            proc = subprocess.Popen(command + [path], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    start_new_session=True)
+            processes.add(proc)
+        try:
+            output, _ = proc.communicate(timeout=time_limit)
+            timed_out = False
+        except subprocess.TimeoutExpired:
+            kill_process_group(proc)
+            output, _ = proc.communicate()
+            timed_out = True
+        finally:
+            with lock:
+                processes.discard(proc)
+        runtime = int((time.perf_counter() - start) * 1000)
+        stdout = output.decode(errors='replace')
+        if timed_out:
+            return 'timeout', int(time_limit * 1000), stdout
+        if proc.returncode < 0:
+            # killed by a signal, e.g. after running out of memory
+            return 'error', runtime, stdout
+        return parse_answer(stdout), runtime, stdout
+
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    futures = {executor.submit(run, path): i for i, path in enumerate(paths)}
+    try:
+        for future in as_completed(futures):
+            yield (futures[future],) + future.result()
+    finally:
+        with lock:
+            stopping[0] = True
+            for proc in processes:
+                kill_process_group(proc)
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+def local_run(args):
+    # runs the solver on this machine and writes the results to a run file in
+    # the form of /runs/{id}/results and /results/{id}, which results.py and
+    # compare_runs.py accept in place of a run ID
+    benchmark_info, instances = local_instances(args)
+    if not instances:
+        print("error: the benchmark has no instances")
+        sys.exit(1)
+    if args.arguments is not None:
+        arguments = shlex.split(args.arguments)
+    elif args.interactive:
+        arguments = prompt_arguments()
+        if arguments is None:
+            arguments = default_solver_arguments(args.local)
+    else:
+        arguments = default_solver_arguments(args.local)
+    output = args.output or f"local-run-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    print(f"Running {' '.join([args.local] + arguments)} on {len(instances)} instances of {benchmark_info['name']} "
+          f"with {args.jobs} jobs and a time limit of {args.time_limit:g} seconds.")
+
+    run_info = {'id': None, 'benchmark_id': benchmark_info['id'], 'solver_id': None, 'arguments': json.dumps(arguments),
+                'description': args.description, 'performance': args.performance, 'start_date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'time_limit': args.time_limit, 'memory_limit': args.memory_limit}
+    solver_info = [{'id': None, 'name': os.path.basename(args.local)}]
+    instance_info = [{'id': i + 1, 'name': name} for i, (name, path) in enumerate(instances)]
+    results = [None] * len(instances)
+    details = [None] * len(instances)
+    counts = dict.fromkeys(LOCAL_ANSWERS + ('timeout', 'error'), 0)
+    command = solver_command(args.local, arguments, args.memory_limit)
+    for n, (i, status, runtime, stdout) in enumerate(run_local(command, [path for name, path in instances], args.time_limit, args.jobs), 1):
+        result = {'id': i + 1, 'run_id': None, 'instance_id': i + 1, 'result': status, 'runtime': runtime}
+        results[i] = result
+        details[i] = dict(result, stdout=stdout, validations=[])
+        counts[status] += 1
+        print(f"[{n}/{len(instances)}] {instances[i][0]}: {status} ({runtime * 0.001:.3f} seconds)")
+        sys.stdout.flush()
+
+    with open(output, "w") as f_run:
+        json.dump({'run': run_info, 'benchmark': benchmark_info, 'solvers': solver_info,
+                   'instances': instance_info, 'results': results, 'details': details}, f_run)
+    print(f"SAT: {counts['sat']} UNSAT: {counts['unsat']} TIMEOUT: {counts['timeout']} UNKNOWN: {counts['unknown']} ERROR: {counts['error']}")
+    print(f"Results written to {output}.")
+
 def main():
     parser = argparse.ArgumentParser(description="Run benchmarks on SMTLab")
-    parser.add_argument('--endpoint', help="Base URL of API endpoint", default=os.environ['SMTLAB_API_ENDPOINT'])
+    add_client_arguments(parser)
     parser.add_argument("-i", "--interactive", default=False, action="store_true", help="Choose run parameters interactively")
     parser.add_argument("-s", "--solver", type=int, help="ID of solver to run")
     parser.add_argument("-b", "--benchmark", type=int, help="ID of benchmark to run")
     parser.add_argument("-p", "--performance", default=False, action="store_true", help="Start run in performance mode (default is regression mode)")
+    parser.add_argument("-d", "--description", default="", help="Description of the run")
+    parser.add_argument("--spec", help="JSON or YAML file listing solvers, benchmarks, argument sets and modes; every combination is submitted")
+    parser.add_argument("--manifest", help="With --spec, write the created runs to this JSON file")
+    parser.add_argument("-a", "--arguments", help="Arguments to pass to the solver instead of its default arguments (write --arguments='-x ...' if they start with '-')")
+    parser.add_argument("-j", "--jobs", type=int, help="With --spec, number of runs to submit concurrently (default: 8); "
+                                                       "with --local, number of solvers to run at a time (default: number of CPUs)")
+    add_picker_arguments(parser)
+    parser.add_argument("-n", "--dry-run", default=False, action="store_true", help="With --spec, print the runs that would be submitted and exit")
+    parser.add_argument("--local", metavar="SOLVER", help="Run this solver binary on this machine instead of on SMTLab; "
+                                                          "runs on the benchmark given with -b if it was uploaded from this machine, or on --instances")
+    parser.add_argument("--instances", help="With --local, run on the .smt2 files under this directory")
+    parser.add_argument("--time-limit", type=float, default=60.0, help="With --local, time limit in seconds per instance (default: 60)")
+    parser.add_argument("--memory-limit", type=int, help="With --local, memory limit in MB per instance (default: none)")
+    parser.add_argument("-o", "--output", help="With --local, write the results to this file (default: local-run-<date>-<time>.json)")
 
     args = parser.parse_args()
+    if args.local:
+        if args.benchmark is None and not args.instances:
+            print("error: --local needs --benchmark or --instances")
+            sys.exit(1)
+        if args.jobs is None:
+            args.jobs = os.cpu_count() or 1
+        local_run(args)
+        return
+    if args.jobs is None:
+        args.jobs = 8
+    client = Client.from_args(args, pool_size=args.jobs)
+    if args.spec:
+        spec = load_spec(args.spec)
+        all_run_parameters = expand_spec(spec, client.get_json("/solvers"), client.get_json("/benchmarks"))
+        if args.dry_run:
+            for run_parameters in all_run_parameters:
+                print(json.dumps(run_parameters))
+            return
+        manifest = submit_runs(client, all_run_parameters, args.jobs)
+        # so that 'results.py -i' lists the new runs
+        Listings(client).invalidate('runs')
+        nFailed = 0
+        for run in manifest:
+            if run['id'] is None:
+                nFailed += 1
+                print(f"Failed to create run of solver {run['solver_id']} on benchmark {run['benchmark_id']}: {run['error']}")
+            else:
+                print(f"Run {run['id']} created.")
+        if args.manifest:
+            with open(args.manifest, "w") as f_manifest:
+                json.dump(manifest, f_manifest, indent=2)
+        if nFailed > 0:
+            sys.exit(1)
+        return
+
     run_parameters = {}
     if args.interactive:
-        run_parameters = interact(args)
+        run_parameters = interact(args, client)
     else:
-        # TODO
-        pass
+        if args.solver is None or args.benchmark is None:
+            print("error: --solver and --benchmark, '--spec' or '--interactive' must be specified")
+            sys.exit(1)
+        run_parameters['benchmark_id'] = args.benchmark
+        run_parameters['solver_id'] = args.solver
+        run_parameters['performance'] = args.performance
+        run_parameters['description'] = args.description
+    if args.arguments is not None:
+        run_parameters['arguments'] = json.dumps(shlex.split(args.arguments))
 
-    r = requests.post(args.endpoint + "/runs", json=run_parameters, auth=(username,password))
-    if r.status_code != requests.codes.ok:
-        print(r.json())
-        r.raise_for_status()
-    run_id = r.json()['id']
+    run_id = client.post_json("/runs", run_parameters)['id']
+    Listings(client).invalidate('runs')
     print(f"Run {run_id} created.")
 
 if __name__ == '__main__':
-    main()
+    run_main(main)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+import importlib
+import os
+import sys
+
+# Single entry point for the SMTLab scripts: `smtlab <command> [<args>]`.
+# Only the module of the chosen command is imported, so that --help and
+# usage errors do not pay for loading requests, numpy and the like.
+
+COMMANDS = {
+    'run': ('run_solver', "Run benchmarks on SMTLab"),
+    'results': ('results', "Get results of SMTLab benchmark runs"),
+    'compare': ('compare_runs', "Compare SMTLab runs on the same benchmark"),
+    'export': ('export_results', "Export results of SMTLab benchmark runs"),
+    'history': ('history', "Track per-instance outcomes across the runs on an SMTLab benchmark"),
+    'upload-benchmark': ('upload_benchmark', "Upload SMT2 benchmarks to SMTLab"),
+    'index': ('benchmark_index', "Index SMT2 benchmarks and pick stratified samples of them"),
+    'upload-solver': ('upload_solver', "Upload solver binary to SMTLab"),
+    'create-user': ('create_user', "Create an SMTLab user"),
+    'passwd': ('passwd', "Change the password of an SMTLab account"),
+}
+
+def usage(out):
+    print("usage: smtlab [-h] <command> [<args>]", file=out)
+    print(file=out)
+    print("commands:", file=out)
+    width = max(len(command) for command in COMMANDS)
+    for command, (_, description) in COMMANDS.items():
+        print(f"  {command:<{width}}  {description}", file=out)
+    print(file=out)
+    print("Run 'smtlab <command> --help' for the options of a command. The server and account are", file=out)
+    print("taken from SMTLAB_API_ENDPOINT, SMTLAB_USERNAME and SMTLAB_PASSWORD, or from the [smtlab]", file=out)
+    print("section of $SMTLAB_CONFIG (default: ~/.config/smtlab/config.ini).", file=out)
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv:
+        usage(sys.stderr)
+        sys.exit(2)
+    if argv[0] in ('-h', '--help'):
+        usage(sys.stdout)
+        return
+    command = argv[0]
+    if command not in COMMANDS:
+        print(f"smtlab: error: unknown command '{command}'", file=sys.stderr)
+        usage(sys.stderr)
+        sys.exit(2)
+
+    module = importlib.import_module(COMMANDS[command][0])
+    from smtlab_trace import run_main
+    # the command's parser takes its arguments and program name from sys.argv
+    sys.argv = [f"{os.path.basename(sys.argv[0])} {command}"] + argv[1:]
+    return run_main(module.main)
+
+if __name__ == '__main__':
+    main()
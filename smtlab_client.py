@@ -0,0 +1,373 @@
+import codecs
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from smtlab_trace import Tracer, add_trace_arguments
+
+# Shared HTTP client for the SMTLab scripts: one keep-alive session per
+# process, retries with exponential backoff, and a timeout on every call.
+# requests is only imported once a client is created, so that --help and
+# usage errors stay fast.
+
+# request bodies smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+
+# how a server may word a 400 for a content coding it does not support
+CONTENT_CODING_ERROR = re.compile(r"content[- ]?(?:en)?coding|unsupported (?:en)?coding|decompress|gzip|zstd", re.IGNORECASE)
+
+CONFIG_ENVIRONMENT = {'endpoint': 'SMTLAB_API_ENDPOINT', 'username': 'SMTLAB_USERNAME', 'password': 'SMTLAB_PASSWORD'}
+
+def config_path():
+    if 'SMTLAB_CONFIG' in os.environ:
+        return os.environ['SMTLAB_CONFIG']
+    base = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(base, 'smtlab', 'config.ini')
+
+def load_config():
+    # endpoint, username and password from the [smtlab] section of the
+    # config file, overridden by the SMTLAB_* environment variables
+    config = {}
+    path = config_path()
+    if os.path.exists(path):
+        import configparser
+        parser = configparser.ConfigParser()
+        parser.read(path)
+        if parser.has_section('smtlab'):
+            for key in CONFIG_ENVIRONMENT:
+                if parser.has_option('smtlab', key):
+                    config[key] = parser.get('smtlab', key)
+    for key, variable in CONFIG_ENVIRONMENT.items():
+        if variable in os.environ:
+            config[key] = os.environ[variable]
+    return config
+
+def add_client_arguments(parser):
+    parser.add_argument('--endpoint', help="Base URL of API endpoint (default: $SMTLAB_API_ENDPOINT or the config file)")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Timeout in seconds for each request to the server (default: 60)")
+    parser.add_argument('--retries', type=int, default=5, help="Number of times to retry a failed request (default: 5)")
+    parser.add_argument('--no-compression', default=False, action='store_true', help="Send uploads uncompressed")
+    add_trace_arguments(parser)
+
+def check_response(r):
+    if r.status_code != 200:
+        try:
+            print(r.json())
+        except ValueError:
+            print(r.text)
+        r.raise_for_status()
+
+def ordered_map(fn, items, jobs):
+    # like map(fn, items), but runs up to 'jobs' calls concurrently; results
+    # are yielded in the order of items, and items are only consumed as
+    # calls complete, so the input may be an unbounded generator
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def iter_json_array(chunks):
+    # incrementally decodes a JSON array from an iterable of byte chunks,
+    # yielding each element as soon as it is complete
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buf = ""
+    pos = 0
+    started = False
+    eof = False
+    chunks = iter(chunks)
+    while True:
+        # skip whitespace and separators
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError("expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                element, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            # an element that reaches the end of the buffer may be truncated
+            if end is not None and (end < len(buf) or eof):
+                pos = end
+                yield element
+                continue
+        if eof:
+            raise ValueError("unexpected end of JSON array")
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buf = buf[pos:] + text_decoder.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + text_decoder.decode(chunk)
+        pos = 0
+
+def counted(chunks, sent):
+    for chunk in chunks:
+        sent[0] += len(chunk)
+        yield chunk
+
+def available_encodings():
+    # content codings for request bodies, in order of preference
+    encodings = []
+    try:
+        import zstandard
+        encodings.append('zstd')
+    except ImportError:
+        pass
+    encodings.append('gzip')
+    return encodings
+
+def compress_chunks(chunks, encoding):
+    if encoding == 'zstd':
+        import zstandard
+        compressor = zstandard.ZstdCompressor().compressobj()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def peek_chunks(chunks, size):
+    # returns the first chunks of an iterable, up to at least size bytes,
+    # and an iterator over the rest, or None for the rest if the iterable
+    # ended before size bytes
+    chunks = iter(chunks)
+    head = []
+    n = 0
+    for chunk in chunks:
+        head.append(chunk)
+        n += len(chunk)
+        if n >= size:
+            return head, chunks
+    return head, None
+
+def format_size(n):
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n} {unit}" if unit == "bytes" else f"{n:.1f} {unit}"
+        n /= 1024.0
+
+def rejects_content_coding(r):
+    # 415 Unsupported Media Type, or a 400 from a server that reports an
+    # unsupported coding as a bad request
+    if r.status_code == 415:
+        return True
+    return r.status_code == 400 and CONTENT_CODING_ERROR.search(r.text) is not None
+
+def response_wire_bytes(r):
+    # bytes read from the connection, before any content decoding
+    try:
+        return r.raw.tell()
+    except (AttributeError, ValueError):
+        return len(r.content)
+
+def response_retries(r):
+    retries = getattr(r.raw, 'retries', None)
+    if retries is None:
+        return 0
+    return len(retries.history)
+
+class Client:
+    def __init__(self, endpoint, username, password, pool_size=10, timeout=60.0, retries=5, tracer=None, compression=True):
+        import requests
+        import requests.adapters
+        import urllib3.util
+        from urllib3.util.retry import Retry
+        self.endpoint = endpoint
+        self.username = username
+        self.timeout = timeout
+        self.tracer = tracer
+        self.request_exception = requests.RequestException
+        # codings still to try for request bodies; dropped as the server rejects them
+        self.content_encodings = available_encodings() if compression else []
+        self.lock = threading.Lock()
+        # body bytes before and after content coding, and bytes sent in
+        # compressed uploads the server rejected
+        self.transfer = {'sent': 0, 'sent_wire': 0, 'received': 0, 'received_wire': 0, 'rejected': 0}
+        self.session = requests.Session()
+        self.session.auth = (username, password)
+        # every coding urllib3 can decode with the installed libraries
+        self.session.headers['Accept-Encoding'] = urllib3.util.make_headers(accept_encoding=True)['accept-encoding']
+        # only idempotent requests are retried after the server has seen them;
+        # connection failures are retried for every method
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=Retry.DEFAULT_ALLOWED_METHODS, raise_on_status=False)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def from_args(cls, args, pool_size=10):
+        config = load_config()
+        if args.endpoint:
+            config['endpoint'] = args.endpoint
+        missing = [CONFIG_ENVIRONMENT[key] for key in CONFIG_ENVIRONMENT if not config.get(key)]
+        if missing:
+            print(f"error: {', '.join(missing)} must be set, or configured in {config_path()}")
+            sys.exit(1)
+        tracer = None
+        if args.trace or args.trace_output:
+            tracer = Tracer(summary=args.trace, output=args.trace_output)
+        return cls(config['endpoint'], config['username'], config['password'],
+                   pool_size=pool_size, timeout=args.timeout, retries=args.retries, tracer=tracer,
+                   compression=not args.no_compression)
+
+    def count_transfer(self, sent, sent_wire, received, received_wire, rejected=0):
+        with self.lock:
+            self.transfer['sent'] += sent
+            self.transfer['sent_wire'] += sent_wire
+            self.transfer['received'] += received
+            self.transfer['received_wire'] += received_wire
+            self.transfer['rejected'] += rejected
+
+    def transfer_summary(self):
+        # e.g. "Sent 12.0 MB as 1.1 MB (10.9x, 10.9 MB saved by compression)"
+        lines = []
+        for direction, size, wire_size in (("Sent", self.transfer['sent'], self.transfer['sent_wire']),
+                                           ("Received", self.transfer['received'], self.transfer['received_wire'])):
+            if size > 0:
+                ratio = size / wire_size if wire_size > 0 else 1.0
+                if size >= wire_size:
+                    saved = f"{format_size(size - wire_size)} saved by compression"
+                else:
+                    saved = f"{format_size(wire_size - size)} of compression overhead"
+                lines.append(f"{direction} {format_size(size)} as {format_size(wire_size)} ({ratio:.1f}x, {saved})")
+        if self.transfer['rejected'] > 0:
+            lines.append(f"Also sent {format_size(self.transfer['rejected'])} in compressed uploads the server rejected")
+        return "\n".join(lines)
+
+    def request(self, method, path, body_size=None, **kwargs):
+        # body_size, if given, is a one-element list holding the size of the
+        # request body before content coding once it has been sent
+        kwargs.setdefault('timeout', self.timeout)
+        sent = [0]
+        data = kwargs.get('data')
+        if data is not None and not isinstance(data, (bytes, str, dict)):
+            kwargs['data'] = counted(data, sent)
+        start = time.perf_counter()
+        try:
+            r = self.session.request(method, self.endpoint + path, **kwargs)
+        except self.request_exception:
+            if self.tracer is not None:
+                self.tracer.record(method, path, None, start, time.perf_counter(), sent[0], 0, 0)
+            raise
+        if isinstance(r.request.body, (bytes, str)):
+            sent[0] = len(r.request.body)
+        r.sent_bytes = sent[0]
+        if kwargs.get('stream'):
+            # counted and recorded once the body has been consumed
+            self.count_transfer(sent[0] if body_size is None else body_size[0], sent[0], 0, 0)
+            r.trace_info = (start, sent[0])
+        else:
+            received_wire = response_wire_bytes(r)
+            self.count_transfer(sent[0] if body_size is None else body_size[0], sent[0], len(r.content), received_wire)
+            if self.tracer is not None:
+                self.tracer.record(method, path, r.status_code, start, time.perf_counter(), sent[0], received_wire, response_retries(r))
+        return r
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def get_json(self, path):
+        r = self.get(path)
+        check_response(r)
+        return r.json()
+
+    def get_json_stream(self, path, chunk_size=256 * 1024, validators=None):
+        # yields the elements of a JSON array response as they are received.
+        # validators, if given, is a dict holding the ETag and Last-Modified
+        # of the previous response to this path; the request is then made
+        # conditional, and nothing is yielded if the server answers 304 Not
+        # Modified
+        headers = {}
+        if validators:
+            if 'etag' in validators:
+                headers['If-None-Match'] = validators['etag']
+            if 'last_modified' in validators:
+                headers['If-Modified-Since'] = validators['last_modified']
+        r = self.get(path, stream=True, headers=headers)
+        if r.status_code != 304:
+            check_response(r)
+            if validators is not None:
+                validators.clear()
+                if 'ETag' in r.headers:
+                    validators['etag'] = r.headers['ETag']
+                if 'Last-Modified' in r.headers:
+                    validators['last_modified'] = r.headers['Last-Modified']
+        received = [0]
+        try:
+            if r.status_code != 304:
+                yield from iter_json_array(counted(r.iter_content(chunk_size=chunk_size), received))
+        finally:
+            received_wire = response_wire_bytes(r)
+            self.count_transfer(0, 0, received[0], received_wire)
+            if self.tracer is not None:
+                start, sent = r.trace_info
+                self.tracer.record('GET', path, r.status_code, start, time.perf_counter(), sent, received_wire, response_retries(r))
+            r.close()
+
+    def post_encoded(self, path, body, headers=None):
+        # POSTs body, compressed with the first content coding the server
+        # accepts. body is bytes, or a function returning an iterable of
+        # byte chunks, so that it can be sent again if the server rejects
+        # the coding; a rejected coding is not tried again. Any other error
+        # is returned as it is.
+        headers = dict(headers or {})
+        encoding = self.content_encodings[0] if self.content_encodings else None
+        if encoding is None:
+            return self.post(path, data=body if isinstance(body, bytes) else body(), headers=headers)
+        if isinstance(body, bytes):
+            if len(body) < MIN_COMPRESS_SIZE:
+                return self.post(path, data=body, headers=headers)
+            chunks = [body]
+        else:
+            head, rest = peek_chunks(body(), MIN_COMPRESS_SIZE)
+            if rest is None:
+                return self.post(path, data=b"".join(head), headers=headers)
+            chunks = itertools.chain(head, rest)
+        body_size = [0]
+        data = compress_chunks(counted(chunks, body_size), encoding)
+        if isinstance(body, bytes):
+            data = b"".join(data)
+        r = self.post(path, data=data, headers=dict(headers, **{'Content-Encoding': encoding}), body_size=body_size)
+        if rejects_content_coding(r):
+            # the body will be counted again; the bytes sent are counted as rejected
+            self.count_transfer(-body_size[0], -r.sent_bytes, 0, 0, rejected=r.sent_bytes)
+            with self.lock:
+                if self.content_encodings and self.content_encodings[0] == encoding:
+                    self.content_encodings.pop(0)
+            r.close()
+            return self.post_encoded(path, body, headers)
+        return r
+
+    def post_json(self, path, body, compress=False):
+        if compress:
+            r = self.post_encoded(path, json.dumps(body).encode(), headers={'Content-Type': 'application/json'})
+        else:
+            r = self.post(path, json=body)
+        check_response(r)
+        return r.json()
@@ -0,0 +1,110 @@
+import atexit
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+
+# Per-request tracing for smtlab_client.Client (--trace, --trace-output)
+# and cProfile support for the scripts' main() (--profile).
+
+def add_trace_arguments(parser):
+    parser.add_argument('--trace', default=False, action='store_true', help="Print a summary of all requests to the server at exit")
+    parser.add_argument('--trace-output', help="Write every request to this file: Chrome trace events if it ends in .json, otherwise JSONL")
+    parser.add_argument('--profile', help="Run under cProfile and write the stats to this file")
+
+def path_template(path):
+    # /runs/12/results -> /runs/{id}/results
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path.split('?')[0])
+
+def percentile(sorted_values, p):
+    # nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(p * len(sorted_values) / 100.0) - 1))
+    return sorted_values[rank]
+
+class Tracer:
+    def __init__(self, summary=True, output=None):
+        self.summary = summary
+        self.output = output
+        self.records = []
+        self.lock = threading.Lock()
+        self.origin = time.time() - time.perf_counter()
+        atexit.register(self.finish)
+
+    def record(self, method, path, status, start, end, bytes_sent, bytes_received, retries):
+        record = {'method': method, 'path': path_template(path), 'url_path': path, 'status': status,
+                  'start': self.origin + start, 'latency': end - start,
+                  'bytes_sent': bytes_sent, 'bytes_received': bytes_received, 'retries': retries,
+                  'thread': threading.get_ident()}
+        with self.lock:
+            self.records.append(record)
+
+    def finish(self):
+        if self.output:
+            self.write(self.output)
+        if self.summary:
+            self.print_summary(sys.stderr)
+
+    def write(self, path):
+        with open(path, "w") as f_out:
+            if path.endswith(".json"):
+                # Chrome trace event format, viewable in chrome://tracing or Perfetto
+                pid = os.getpid()
+                events = [{'name': f"{record['method']} {record['path']}", 'cat': 'http', 'ph': 'X',
+                           'ts': record['start'] * 1e6, 'dur': record['latency'] * 1e6, 'pid': pid, 'tid': record['thread'],
+                           'args': {'url': record['url_path'], 'status': record['status'], 'bytes_sent': record['bytes_sent'],
+                                    'bytes_received': record['bytes_received'], 'retries': record['retries']}}
+                          for record in self.records]
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f_out)
+            else:
+                for record in self.records:
+                    f_out.write(json.dumps(record) + "\n")
+
+    def print_summary(self, out):
+        groups = {}
+        for record in self.records:
+            groups.setdefault((record['method'], record['path']), []).append(record)
+        if not groups:
+            return
+        width = max(len(f"{method} {path}") for method, path in groups)
+        print(file=out)
+        print(f"{'request':<{width}} {'count':>7} {'errors':>6} {'retries':>7} {'total (s)':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'sent (KB)':>10} {'recv (KB)':>10}", file=out)
+        totals = [0, 0, 0, 0.0, 0, 0]
+        for (method, path), records in sorted(groups.items(), key=lambda item: -sum(r['latency'] for r in item[1])):
+            latencies = sorted(record['latency'] for record in records)
+            errors = sum(1 for record in records if record['status'] is None or record['status'] >= 400)
+            retries = sum(record['retries'] for record in records)
+            sent = sum(record['bytes_sent'] for record in records)
+            received = sum(record['bytes_received'] for record in records)
+            total = sum(latencies)
+            print(f"{method + ' ' + path:<{width}} {len(records):>7} {errors:>6} {retries:>7} {total:>10.3f} "
+                  f"{percentile(latencies, 50) * 1000:>9.1f} {percentile(latencies, 95) * 1000:>9.1f} {percentile(latencies, 99) * 1000:>9.1f} "
+                  f"{sent / 1024:>10.1f} {received / 1024:>10.1f}", file=out)
+            for i, value in enumerate([len(records), errors, retries, total, sent, received]):
+                totals[i] += value
+        print(f"{'total':<{width}} {totals[0]:>7} {totals[1]:>6} {totals[2]:>7} {totals[3]:>10.3f} {'':>9} {'':>9} {'':>9} "
+              f"{totals[4] / 1024:>10.1f} {totals[5] / 1024:>10.1f}", file=out)
+
+def run_main(main):
+    # calls main(), under cProfile if --profile FILE was given
+    profile_file = None
+    for i, arg in enumerate(sys.argv):
+        if arg == '--profile' and i + 1 < len(sys.argv):
+            profile_file = sys.argv[i + 1]
+        elif arg.startswith('--profile='):
+            profile_file = arg[len('--profile='):]
+    if profile_file is None:
+        return main()
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return main()
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_file)
+        print(f"Profile written to {profile_file}; view it with: python -m pstats {profile_file}", file=sys.stderr)
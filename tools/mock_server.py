@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+
+import argparse
+import base64
+import gzip
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A local stand-in for the SMTLab API, serving the endpoints used by the
+# scripts in this repository. Benchmarks, runs and results are synthetic and
+# generated deterministically on demand, so that runs of millions of
+# instances do not need to be held in memory; benchmarks, solvers and runs
+# created through the API are kept in memory.
+
+# instance IDs are benchmark_id * ID_STRIDE + index, and result IDs are
+# run_id * ID_STRIDE + index, so either can be mapped back without a table
+ID_STRIDE = 10 ** 7
+TIMEOUT_MS = 60000
+MASK64 = (1 << 64) - 1
+
+def mix(*values):
+    # splitmix64 over the given integers; a cheap deterministic hash
+    x = 0x9E3779B97F4A7C15
+    for value in values:
+        x = (x ^ (value & MASK64)) & MASK64
+        x = (x + 0x9E3779B97F4A7C15) & MASK64
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+        x = x ^ (x >> 31)
+    return x
+
+def uniform(*values):
+    return mix(*values) / float(1 << 64)
+
+LOGICS = ['QF_S', 'QF_SLIA', 'QF_LIA', 'QF_BV', 'QF_NRA']
+
+CRASHES = [
+    "Assertion violation: File: {path}/src/smt/theory_seq.cpp Line: {line}\nsolver: 0x{addr:012x} in theory_seq::propagate() ()\nsolver: 0x{addr2:012x} in smt::context::bcp() ()\n",
+    "Segmentation fault (core dumped) at address 0x{addr:012x}\n#0 0x{addr2:012x} in rewriter::mk_app({line}) {path}/src/ast/rewriter.cpp\n",
+    "(error \"line {line} column 12: unknown constant x{line}\")\n",
+    "terminate called after throwing an instance of 'std::bad_alloc'\n  what():  std::bad_alloc\nAborted after {line} ms at 0x{addr:012x}\n",
+]
+
+class Benchmark:
+    def __init__(self, id, name, count=0, synthetic=False):
+        self.id = id
+        self.name = name
+        self.synthetic = synthetic
+        self.count = count
+        self.names = [] if not synthetic else None
+
+    def instance_name(self, i):
+        if self.synthetic:
+            return f"{LOGICS[mix(self.id, i) % len(LOGICS)]}/{i // 1000:04d}/instance{i:07d}.smt2"
+        return self.names[i]
+
+    def instance_json(self, i):
+        return {'id': self.id * ID_STRIDE + i, 'name': self.instance_name(i)}
+
+class Run:
+    def __init__(self, id, benchmark_id, solver_id, arguments, description, performance, progress_rate=None):
+        self.id = id
+        self.benchmark_id = benchmark_id
+        self.solver_id = solver_id
+        self.arguments = arguments
+        self.description = description
+        self.performance = performance
+        self.start_time = time.time()
+        self.start_date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.start_time))
+        # results per second, or None if all results are available at once
+        self.progress_rate = progress_rate
+
+    def to_json(self):
+        return {'id': self.id, 'benchmark_id': self.benchmark_id, 'solver_id': self.solver_id, 'arguments': self.arguments,
+                'description': self.description, 'performance': self.performance, 'start_date': self.start_date}
+
+class MockState:
+    def __init__(self, n_benchmarks, n_instances, n_runs, seed, progress_rate=None, error_rate=0.005):
+        self.lock = threading.Lock()
+        self.seed = seed
+        self.progress_rate = progress_rate
+        self.error_rate = error_rate
+        self.benchmarks = OrderedDict()
+        self.solvers = OrderedDict()
+        self.runs = OrderedDict()
+        self.next_id = {'benchmark': 1, 'solver': 1, 'run': 1}
+        # encoded responses for the large synthetic lists
+        self.response_cache = OrderedDict()
+        self.response_cache_size = 8
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+        for name, validation in [('z3', False), ('cvc5', False), ('z3str4', False), ('validator', True)]:
+            self.add_solver({'name': name, 'validation_solver': validation, 'default_arguments': None})
+        for b in range(n_benchmarks):
+            benchmark = Benchmark(self.new_id('benchmark'), f"synthetic-{b + 1}", n_instances, synthetic=True)
+            self.benchmarks[benchmark.id] = benchmark
+            for r in range(n_runs):
+                solver_id = list(self.solvers)[r % 3]
+                run = Run(self.new_id('run'), benchmark.id, solver_id, None, f"synthetic run {r + 1}", r % 2 == 1)
+                self.runs[run.id] = run
+
+    def new_id(self, kind):
+        with self.lock:
+            id = self.next_id[kind]
+            self.next_id[kind] += 1
+            return id
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {'requests': 0, 'bytes_in': 0, 'bytes_out': 0, 'by_path': {}}
+
+    def record(self, method, path, bytes_in, bytes_out):
+        template = re.sub(r"/\d+", "/{id}", path)
+        with self.stats_lock:
+            self.stats['requests'] += 1
+            self.stats['bytes_in'] += bytes_in
+            self.stats['bytes_out'] += bytes_out
+            key = f"{method} {template}"
+            self.stats['by_path'][key] = self.stats['by_path'].get(key, 0) + 1
+
+    def add_solver(self, request):
+        id = self.new_id('solver')
+        self.solvers[id] = {'id': id, 'name': request['name'], 'validation_solver': request.get('validation_solver', False),
+                            'default_arguments': request.get('default_arguments')}
+        return id
+
+    def validator_id(self):
+        for solver in self.solvers.values():
+            if solver['validation_solver']:
+                return solver['id']
+        return None
+
+    def visible_results(self, run):
+        count = self.benchmarks[run.benchmark_id].count
+        if run.progress_rate is None:
+            return count
+        return min(count, int((time.time() - run.start_time) * run.progress_rate))
+
+    def result(self, run, i):
+        # instances have a fixed answer and difficulty; each solver adds noise
+        difficulty = uniform(self.seed, run.benchmark_id, i)
+        answer = 'sat' if mix(self.seed, run.benchmark_id, i, 1) % 2 == 0 else 'unsat'
+        noise = uniform(self.seed, run.solver_id, run.benchmark_id, i)
+        runtime = int(TIMEOUT_MS * difficulty ** 3 * (0.5 + noise))
+        if noise > 1.0 - self.error_rate:
+            status = 'error'
+        elif noise > 0.985 - self.error_rate:
+            status = 'unknown'
+        elif runtime >= TIMEOUT_MS:
+            status = 'timeout'
+            runtime = TIMEOUT_MS
+        else:
+            status = answer
+        return {'id': run.id * ID_STRIDE + i, 'run_id': run.id, 'instance_id': run.benchmark_id * ID_STRIDE + i,
+                'result': status, 'runtime': runtime}
+
+    def result_details(self, result_id):
+        run = self.runs.get(result_id // ID_STRIDE)
+        i = result_id % ID_STRIDE
+        if run is None or i >= self.visible_results(run):
+            return None
+        result = self.result(run, i)
+        stdout = result['result'] + "\n"
+        validations = []
+        if result['result'] == 'error':
+            h = mix(self.seed, run.solver_id, i, 2)
+            stdout = CRASHES[h % len(CRASHES)].format(path=f"/home/build{h % 7}/solver", line=h % 5000,
+                                                      addr=mix(h, 1) & 0xFFFFFFFFFFFF, addr2=mix(h, 2) & 0xFFFFFFFFFFFF)
+        validator = self.validator_id()
+        if validator is not None and result['result'] == 'sat':
+            validations.append({'solver_id': validator, 'validation': 'invalid' if uniform(self.seed, result_id, 3) < 0.01 else 'valid'})
+        if result['result'] in ('sat', 'unsat'):
+            other = list(self.solvers)[(run.solver_id) % 3]
+            disagree = uniform(self.seed, result_id, 4) < 0.005
+            other_result = result['result'] if not disagree else ('unsat' if result['result'] == 'sat' else 'sat')
+            validations.append({'solver_id': other, 'result': other_result})
+        return dict(result, stdout=stdout, validations=validations)
+
+    def cached_response(self, key, generate):
+        with self.lock:
+            if key in self.response_cache:
+                self.response_cache.move_to_end(key)
+                return self.response_cache[key]
+        body = generate()
+        with self.lock:
+            self.response_cache[key] = body
+            while len(self.response_cache) > self.response_cache_size:
+                self.response_cache.popitem(last=False)
+        return body
+
+def encode_list(items):
+    return b"[" + b",".join(json.dumps(item).encode() for item in items) + b"]"
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately; without this, delayed ACKs
+    # add ~40 ms to every keep-alive request
+    disable_nagle_algorithm = True
+    state = None
+    latency = 0.0
+    compression = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    # trailer section
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+            body = b"".join(parts)
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.bytes_in = len(body)
+        # returns None for a content coding this server does not accept
+        encoding = self.headers.get('Content-Encoding', 'identity').strip().lower()
+        if encoding == 'identity':
+            return body
+        if not self.compression:
+            return None
+        if encoding == 'gzip':
+            return gzip.decompress(body)
+        if encoding == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                return None
+            return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+        return None
+
+    def send_body(self, status, body, cache_key=None, etag=None):
+        # large responses are gzipped for clients that accept it; cache_key
+        # caches the compressed form of a cached response
+        if etag is not None and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.bytes_out = 0
+            return
+        encoding = None
+        if self.compression and len(body) >= 1024 and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            encoding = 'gzip'
+            compress = lambda: gzip.compress(body, compresslevel=6, mtime=0)
+            body = self.state.cached_response(('gzip',) + cache_key, compress) if cache_key else compress()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.bytes_out = len(body)
+
+    def send_json(self, status, obj):
+        self.send_body(status, json.dumps(obj).encode())
+
+    def not_found(self):
+        self.send_json(404, {'detail': 'Not found'})
+
+    def handle_request(self, method):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        path = self.path.split('?')[0].rstrip('/')
+        if self.latency > 0:
+            time.sleep(self.latency)
+        try:
+            if method == 'GET':
+                self.do_get(path)
+            else:
+                body = self.read_body()
+                if body is None:
+                    self.send_json(415, {'detail': 'Unsupported Content-Encoding'})
+                else:
+                    self.do_post(path, body)
+        finally:
+            if not path.startswith('/_stats'):
+                self.state.record(method, path, self.bytes_in, self.bytes_out)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_get(self, path):
+        state = self.state
+        m = re.fullmatch(r"/benchmarks(?:/(\d+)(/instances)?)?", path)
+        if m:
+            if m.group(1) is None:
+                return self.send_json(200, [{'id': b.id, 'name': b.name} for b in state.benchmarks.values()])
+            benchmark = state.benchmarks.get(int(m.group(1)))
+            if benchmark is None:
+                return self.not_found()
+            if m.group(2) is None:
+                return self.send_json(200, {'id': benchmark.id, 'name': benchmark.name})
+            if benchmark.synthetic:
+                key = ('instances', benchmark.id)
+                body = state.cached_response(key, lambda: encode_list(benchmark.instance_json(i) for i in range(benchmark.count)))
+                return self.send_body(200, body, key)
+            return self.send_body(200, encode_list(benchmark.instance_json(i) for i in range(benchmark.count)))
+        if path == '/solvers':
+            return self.send_json(200, list(state.solvers.values()))
+        m = re.fullmatch(r"/runs(?:/(\d+)(/results)?)?", path)
+        if m:
+            if m.group(1) is None:
+                return self.send_json(200, [run.to_json() for run in state.runs.values()])
+            run = state.runs.get(int(m.group(1)))
+            if run is None:
+                return self.not_found()
+            if m.group(2) is None:
+                return self.send_json(200, run.to_json())
+            count = state.visible_results(run)
+            key = ('results', run.id, count)
+            body = state.cached_response(key, lambda: encode_list(state.result(run, i) for i in range(count)))
+            # the results of a run only change when more become visible
+            return self.send_body(200, body, key, etag=f'"{run.id}-{count}"')
+        m = re.fullmatch(r"/results/(\d+)", path)
+        if m:
+            details = state.result_details(int(m.group(1)))
+            if details is None:
+                return self.not_found()
+            return self.send_json(200, details)
+        if path == '/_stats':
+            with state.stats_lock:
+                return self.send_json(200, state.stats)
+        return self.not_found()
+
+    def do_post(self, path, body):
+        state = self.state
+        try:
+            request = json.loads(body) if body else {}
+        except ValueError:
+            return self.send_json(400, {'detail': 'Invalid JSON'})
+        if path == '/benchmarks':
+            benchmark = Benchmark(state.new_id('benchmark'), request['name'])
+            state.benchmarks[benchmark.id] = benchmark
+            return self.send_json(200, {'id': benchmark.id, 'name': benchmark.name})
+        m = re.fullmatch(r"/benchmarks/(\d+)", path)
+        if m:
+            benchmark = state.benchmarks.get(int(m.group(1)))
+            if benchmark is None or benchmark.synthetic:
+                return self.not_found()
+            with state.lock:
+                for instance in request:
+                    benchmark.names.append(instance['name'])
+                    benchmark.count += 1
+            return self.send_json(200, {})
+        if path == '/solvers':
+            if 'base64_binary' in request:
+                base64.b64decode(request['base64_binary'])
+            id = state.add_solver(request)
+            return self.send_json(200, {'id': id})
+        if path == '/runs':
+            for key in ('benchmark_id', 'solver_id', 'performance'):
+                if key not in request:
+                    return self.send_json(422, {'detail': f"missing field {key}"})
+            if request['benchmark_id'] not in state.benchmarks or request['solver_id'] not in state.solvers:
+                return self.not_found()
+            run = Run(state.new_id('run'), request['benchmark_id'], request['solver_id'], request.get('arguments'),
+                      request.get('description', ""), request['performance'], state.progress_rate)
+            state.runs[run.id] = run
+            return self.send_json(200, run.to_json())
+        if path in ('/users/create', '/users/change_password'):
+            return self.send_json(200, {'username': request.get('username')})
+        if path == '/_stats/reset':
+            state.reset_stats()
+            return self.send_json(200, {})
+        return self.not_found()
+
+def make_server(host, port, state, latency=0.0, compression=True):
+    handler = type('Handler', (MockHandler,), {'state': state, 'latency': latency, 'compression': compression})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock SMTLab API server with synthetic data")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--benchmarks', type=int, default=2, help="Number of synthetic benchmarks (default: 2)")
+    parser.add_argument('--instances', type=int, default=1000, help="Number of instances per synthetic benchmark (default: 1000)")
+    parser.add_argument('--runs', type=int, default=3, help="Number of synthetic runs per benchmark (default: 3)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Added latency per request in milliseconds (default: 0)")
+    parser.add_argument('--progress-rate', type=float, help="Make new runs produce this many results per second, instead of all at once")
+    parser.add_argument('--no-compression', default=False, action='store_true',
+                        help="Reject compressed request bodies with 415 and send responses uncompressed, like a server without compression support")
+    parser.add_argument('--error-rate', type=float, default=0.005, help="Fraction of results that are errors (default: 0.005)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    if args.instances >= ID_STRIDE:
+        parser.error(f"--instances must be less than {ID_STRIDE}")
+
+    state = MockState(args.benchmarks, args.instances, args.runs, args.seed, args.progress_rate, args.error_rate)
+    server = make_server(args.host, args.port, state, args.latency * 0.001, not args.no_compression)
+    print(f"Mock SMTLab server listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import os.path
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from mock_server import MockState, make_server
+
+# Runs the SMTLab scripts against a local mock server and records wall time,
+# request count, bytes transferred and peak RSS for each scenario. Results
+# can be appended to a JSONL history file to compare changes over time.
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ['results', 'results-cached', 'upload-benchmark', 'run-solver']
+
+def server_stats(endpoint, reset=False):
+    if reset:
+        request = urllib.request.Request(endpoint + "/_stats/reset", data=b"", method='POST')
+    else:
+        request = urllib.request.Request(endpoint + "/_stats")
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+def run_script(script, script_args, env):
+    # runs one of the scripts to completion; returns (exit code, wall time, peak RSS in KB)
+    with tempfile.TemporaryFile() as f_err:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, script)] + script_args, env=env,
+                                stdout=subprocess.DEVNULL, stderr=f_err)
+        _, status, rusage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+        exit_code = os.waitstatus_to_exitcode(status)
+        if exit_code != 0:
+            f_err.seek(0)
+            sys.stderr.write(f_err.read().decode(errors='replace'))
+    return exit_code, wall, rusage.ru_maxrss
+
+def make_benchmark_dir(path, n_files, file_size):
+    line = "(assert (= (str.++ x y) \"abcdefghijklmnopqrstuvwxyz\"))\n"
+    body = "(set-logic QF_S)\n(declare-fun x () String)\n(declare-fun y () String)\n"
+    body += line * max(1, (file_size - len(body)) // len(line)) + "(check-sat)\n"
+    for i in range(n_files):
+        subdir = os.path.join(path, f"{i // 1000:04d}")
+        os.makedirs(subdir, exist_ok=True)
+        with open(os.path.join(subdir, f"instance{i:07d}.smt2"), "w") as f_instance:
+            f_instance.write(body)
+
+def scenario_commands(scenario, args, work_dir):
+    # returns a list of (script, arguments); only the last one is measured
+    jobs = ["-j", str(args.jobs)]
+    if scenario == 'results':
+        return [("results.py", ["--no-cache"] + jobs + ["1"])]
+    if scenario == 'results-cached':
+        cache_dir = os.path.join(work_dir, "cache")
+        return [("results.py", ["--cache-dir", cache_dir] + jobs + ["1"]),
+                ("results.py", ["--cache-dir", cache_dir] + jobs + ["1"])]
+    if scenario == 'upload-benchmark':
+        benchmark_dir = os.path.join(work_dir, "benchmark")
+        if not os.path.exists(benchmark_dir):
+            make_benchmark_dir(benchmark_dir, args.files, args.file_size)
+        return [("upload_benchmark.py", jobs + ["perf-harness", benchmark_dir])]
+    if scenario == 'run-solver':
+        spec_file = os.path.join(work_dir, "spec.json")
+        with open(spec_file, "w") as f_spec:
+            json.dump({'solvers': ["z3", "cvc5", "z3str4"], 'benchmarks': [1],
+                       'arguments': [None] + [[f"-seed={n}"] for n in range(args.matrix - 1)],
+                       'performance': [False, True]}, f_spec)
+        return [("run_solver.py", jobs + ["--spec", spec_file])]
+    raise ValueError(scenario)
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def previous_record(history, record):
+    # the most recent earlier record of the same scenario with the same parameters
+    if not history or not os.path.exists(history):
+        return None
+    previous = None
+    with open(history, "r") as f_history:
+        for line in f_history:
+            try:
+                other = json.loads(line)
+            except ValueError:
+                continue
+            if other.get('scenario') == record['scenario'] and other.get('params') == record['params']:
+                previous = other
+    return previous
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the SMTLab scripts against a local mock server")
+    parser.add_argument('-s', '--scenario', action='append', choices=SCENARIOS, help="Scenario to run; may be repeated (default: all)")
+    parser.add_argument('--instances', type=int, default=10000, help="Instances per synthetic benchmark (default: 10000)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mock server latency per request in milliseconds (default: 0)")
+    parser.add_argument('-j', '--jobs', type=int, default=16, help="--jobs passed to the scripts (default: 16)")
+    parser.add_argument('--files', type=int, default=2000, help="Files in the upload-benchmark scenario (default: 2000)")
+    parser.add_argument('--file-size', type=int, default=4096, help="Size in bytes of each uploaded file (default: 4096)")
+    parser.add_argument('--matrix', type=int, default=10, help="Argument sets in the run-solver spec; 6 runs are submitted per set (default: 10)")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Measure each scenario this many times and report the median (default: 3)")
+    parser.add_argument('-o', '--output', help="Append the measurements to this JSONL history file")
+    args = parser.parse_args()
+
+    state = MockState(1, args.instances, 3, 1)
+    server = make_server("127.0.0.1", 0, state, args.latency * 0.001)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+
+    revision = git_revision()
+    failed = False
+    print(f"{'scenario':<18} {'wall (s)':>9} {'requests':>9} {'sent (KB)':>10} {'recv (KB)':>10} {'peak RSS (MB)':>14} {'vs previous':>12}")
+    for scenario in args.scenario or SCENARIOS:
+        work_dir = tempfile.mkdtemp(prefix="smtlab-perf-")
+        env = dict(os.environ, SMTLAB_API_ENDPOINT=endpoint, SMTLAB_USERNAME="perf", SMTLAB_PASSWORD="perf",
+                   XDG_CACHE_HOME=os.path.join(work_dir, "xdg"))
+        try:
+            # warm the server's response cache so that only the client is measured
+            server_stats(endpoint)
+            urllib.request.urlopen(endpoint + "/runs/1/results").read()
+            urllib.request.urlopen(endpoint + "/benchmarks/1/instances").read()
+            samples = []
+            for _ in range(args.repeat):
+                commands = scenario_commands(scenario, args, work_dir)
+                for script, script_args in commands[:-1]:
+                    run_script(script, script_args, env)
+                script, script_args = commands[-1]
+                server_stats(endpoint, reset=True)
+                exit_code, wall, max_rss = run_script(script, script_args, env)
+                stats = server_stats(endpoint)
+                if exit_code != 0:
+                    print(f"{scenario}: {script} exited with status {exit_code}")
+                    failed = True
+                    break
+                samples.append((wall, stats, max_rss))
+                shutil.rmtree(os.path.join(work_dir, "xdg"), ignore_errors=True)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        if not samples:
+            continue
+
+        wall = statistics.median(sample[0] for sample in samples)
+        stats = samples[-1][1]
+        max_rss = max(sample[2] for sample in samples)
+        record = {'time': time.strftime("%Y-%m-%dT%H:%M:%S"), 'revision': revision, 'scenario': scenario,
+                  'params': {'instances': args.instances, 'latency': args.latency, 'jobs': args.jobs, 'files': args.files,
+                             'file_size': args.file_size, 'matrix': args.matrix},
+                  'wall': wall, 'requests': stats['requests'], 'bytes_sent': stats['bytes_in'], 'bytes_received': stats['bytes_out'],
+                  'peak_rss_kb': max_rss, 'by_path': stats['by_path']}
+        previous = previous_record(args.output, record)
+        change = f"{wall / previous['wall']:.2f}x" if previous and previous['wall'] > 0 else ""
+        print(f"{scenario:<18} {wall:>9.3f} {stats['requests']:>9} {stats['bytes_in'] / 1024:>10.1f} {stats['bytes_out'] / 1024:>10.1f} "
+              f"{max_rss / 1024:>14.1f} {change:>12}")
+        if args.output:
+            with open(args.output, "a") as f_history:
+                f_history.write(json.dumps(record) + "\n")
+
+    server.shutdown()
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
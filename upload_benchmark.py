@@ -4,68 +4,215 @@ import os
 import os.path
 import sys
 import argparse
-import requests
+import glob
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from run_cache import default_cache_dir
+from smtlab_client import Client, add_client_arguments
+from smtlab_trace import run_main
 
-def chunks(lst, n):
-    for i in range(0, len(lst), n):
-        yield lst[i:i+n]
+def walk_instances(path):
+    # yields (name, filepath) for every file under path
+    for subdir, dirs, files in os.walk(path):
+        for f in files:
+            filepath = subdir + os.sep + f
+            subpath = os.path.relpath(subdir, path)
+            if subpath == ".":
+                subpath = f
+            else:
+                subpath = subpath + os.sep + f
+            yield subpath, filepath
+
+def manifest_path(endpoint, benchmark_id):
+    endpoint_key = hashlib.sha256(endpoint.encode()).hexdigest()[:16]
+    return os.path.join(default_cache_dir(), "uploads", "{}-{}.json".format(endpoint_key, benchmark_id))
+
+def find_manifest(benchmark_id, endpoint=None):
+    # the manifest of a benchmark uploaded from this machine, or None; without
+    # an endpoint, the benchmark ID must match the upload to a single server
+    if endpoint is not None:
+        path = manifest_path(endpoint, benchmark_id)
+        return path if os.path.exists(path) else None
+    paths = glob.glob(os.path.join(default_cache_dir(), "uploads", "*-{}.json".format(benchmark_id)))
+    return paths[0] if len(paths) == 1 else None
+
+def load_manifest(path):
+    # returns {name: {'size', 'mtime', 'sha256'}} for every instance known to
+    # be on the server, including batches confirmed in the journal of an
+    # upload that did not finish
+    files = {}
+    if os.path.exists(path):
+        with open(path, "r") as f_manifest:
+            files = json.load(f_manifest)['files']
+    journal = path + ".journal"
+    if os.path.exists(journal):
+        with open(journal, "r") as f_journal:
+            for line in f_journal:
+                try:
+                    name, entry = json.loads(line)
+                except ValueError:
+                    # torn write from a crash
+                    break
+                files[name] = entry
+    return files
+
+def save_manifest(path, endpoint, benchmark_id, root, files):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f_manifest:
+        json.dump({'endpoint': endpoint, 'benchmark_id': benchmark_id, 'root': os.path.abspath(root), 'files': files}, f_manifest)
+    os.replace(tmp_path, path)
+    if os.path.exists(path + ".journal"):
+        os.remove(path + ".journal")
+
+def select_instances(paths, manifest, server_names, pending, changed, force=False):
+    # yields the instances that are not on the server yet; files are only
+    # re-hashed when their size or mtime differs from the manifest. The API
+    # cannot replace an instance, so instances whose contents changed since
+    # they were uploaded are added to 'changed' rather than uploaded again
+    # as duplicates, unless force is set.
+    for subpath, filepath in paths:
+        st = os.stat(filepath)
+        entry = manifest.get(subpath)
+        body = None
+        if entry is not None and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime_ns:
+            sha256 = entry['sha256']
+        else:
+            with open(filepath, "r") as f_instance:
+                body = f_instance.read()
+            sha256 = hashlib.sha256(body.encode()).hexdigest()
+        new_entry = {'size': st.st_size, 'mtime': st.st_mtime_ns, 'sha256': sha256}
+        if force or subpath not in server_names:
+            if body is None:
+                with open(filepath, "r") as f_instance:
+                    body = f_instance.read()
+            pending[subpath] = new_entry
+            yield {"name": subpath, "body": body}
+        elif entry is not None and entry['sha256'] != sha256:
+            # the manifest keeps the uploaded version, so this is reported again next time
+            changed.append(subpath)
+        else:
+            manifest[subpath] = new_entry
+
+def batches(instances, max_files, max_bytes):
+    # groups instances into batches of at most max_files files and request
+    # bodies of at most max_bytes, as post_json encodes them before
+    # compression; an instance larger than max_bytes is sent on its own
+    batch = []
+    batch_bytes = 0
+    for instance in instances:
+        # the encoded instance, escapes included, and its ", " or "[]"
+        size = len(json.dumps(instance)) + 2
+        if batch and (len(batch) >= max_files or batch_bytes + size > max_bytes):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(instance)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+def upload_batches(client, path, batches, jobs, verbose=False, on_uploaded=None):
+    # POSTs batches with at most 'jobs' uploads in flight; batches are only
+    # read from the generator as upload slots free up
+    def upload(batch):
+        client.post_json(path, batch, compress=True)
+        return batch
+
+    def finish(done):
+        n = 0
+        for future in done:
+            batch = future.result()
+            if on_uploaded is not None:
+                on_uploaded(batch)
+            if verbose:
+                for inst in batch:
+                    print(inst["name"])
+            n += len(batch)
+        return n
+
+    count = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = set()
+        for batch in batches:
+            pending.add(executor.submit(upload, batch))
+            if len(pending) >= jobs:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                count += finish(done)
+        done, pending = wait(pending)
+        count += finish(done)
+    return count
+
+def upload_instances(client, benchmark_id, root, paths, server_names, jobs=4, batch_files=10, batch_bytes=8*1024*1024,
+                     force=False, verbose=False):
+    # uploads the (name, filepath) instances under root that are not on the
+    # server yet, recording them in the benchmark's upload manifest; returns
+    # the number of instances uploaded. Instances that changed since they
+    # were uploaded are reported and skipped, unless force is set.
+    manifest_file = manifest_path(client.endpoint, benchmark_id)
+    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+    manifest = load_manifest(manifest_file)
+
+    # record each confirmed batch in the journal, so that an interrupted
+    # upload can be resumed with --id
+    pending = {}
+    changed = []
+    with open(manifest_file + ".journal", "a") as journal:
+        def on_uploaded(batch):
+            for inst in batch:
+                entry = pending.pop(inst["name"])
+                manifest[inst["name"]] = entry
+                journal.write(json.dumps([inst["name"], entry]) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+
+        # stream new instances from disk to /benchmarks/{benchmark_id} in batches
+        instances = select_instances(paths, manifest, server_names, pending, changed, force)
+        count = upload_batches(client, "/benchmarks/{}".format(benchmark_id),
+                               batches(instances, batch_files, batch_bytes), jobs, verbose, on_uploaded)
+    save_manifest(manifest_file, client.endpoint, benchmark_id, root, manifest)
+    for name in changed:
+        print("warning: {} changed since it was uploaded; not uploading it again, as the server would keep both copies (use --force to upload it anyway)".format(name))
+    return count
 
 def main():
     parser = argparse.ArgumentParser(description="Upload SMT2 benchmarks to SMTLab")
     parser.add_argument('--id', help="ID number of existing benchmark to add to")
     parser.add_argument('-v', '--verbose', default=False, action='store_true')
-    parser.add_argument('--endpoint', help="Base URL of API endpoint", default=os.environ['SMTLAB_API_ENDPOINT'])
+    parser.add_argument('-j', '--jobs', type=int, default=4, help="Number of batches to upload concurrently (default: 4)")
+    parser.add_argument('--batch-files', type=int, default=10, help="Maximum number of instances per upload request (default: 10)")
+    parser.add_argument('--force', default=False, action='store_true', help="Upload every instance, even if it is already on the server; the server then keeps both copies")
+    parser.add_argument('--batch-bytes', type=int, default=8*1024*1024, help="Maximum size in bytes of each upload request body before compression (default: 8 MiB)")
+    add_client_arguments(parser)
     parser.add_argument("name", help="name of the benchmark to upload")
     parser.add_argument("path", help="path to benchmark folder; all .smt2 files under this path will be uploaded")
 
-    username = os.environ['SMTLAB_USERNAME']
-    password = os.environ['SMTLAB_PASSWORD']
-    
     args = parser.parse_args()
+    if args.jobs < 1 or args.batch_files < 1 or args.batch_bytes < 1:
+        print("error: --jobs, --batch-files and --batch-bytes must be positive")
+        sys.exit(1)
+    client = Client.from_args(args, pool_size=args.jobs)
     benchmark_id = None
     if args.id:
-        r = requests.get(args.endpoint + "/benchmarks/{}".format(args.id), auth=(username,password))
-        if r.status_code != requests.codes.ok:
-            print(r.json())
-            r.raise_for_status()
-        response = r.json()
+        response = client.get_json("/benchmarks/{}".format(args.id))
         if args.verbose:
             print("Adding to benchmark with ID {}".format(response['id']))
         benchmark_id = args.id
     else:
         new_benchmark_rq = {'name': args.name}
-        r = requests.post(args.endpoint + "/benchmarks", json=new_benchmark_rq, auth=(username,password))
-        if r.status_code != requests.codes.ok:
-            print(r.json())
-            r.raise_for_status()
-        response = r.json()
+        response = client.post_json("/benchmarks", new_benchmark_rq)
         if args.verbose:
             print("Created benchmark with ID {}".format(response['id']))
         benchmark_id = response['id']
-    # collect all instances
-    instances = []
-    for subdir, dirs, files in os.walk(args.path):
-        for f in files:
-            filepath = subdir + os.sep + f
-            subpath = os.path.relpath(subdir, args.path)
-            if subpath == ".":
-                subpath = f
-            else:
-                subpath = subpath + os.sep + f
-            with open(filepath, "r") as f_instance:
-                instance = {"name": subpath, "body": f_instance.read()}
-                instances.append(instance)
+    # find out which instances are already on the server
+    server_names = set()
+    if args.id:
+        server_names = set(instance['name'] for instance in client.get_json("/benchmarks/{}/instances".format(benchmark_id)))
+    count = upload_instances(client, benchmark_id, args.path, walk_instances(args.path), server_names,
+                             args.jobs, args.batch_files, args.batch_bytes, args.force, args.verbose)
     if args.verbose:
-        print("Uploading {} instances.".format(len(instances)))
-    # POST instances to /benchmarks/{benchmark_id}
-    for chunk in chunks(instances, 10):
-        if args.verbose:
-            for inst in chunk:
-                print(inst["name"])
-        r = requests.post(args.endpoint + "/benchmarks/{}".format(benchmark_id), json=chunk, auth=(username,password))
-        if r.status_code != requests.codes.ok:
-            print(r.json())
-            r.raise_for_status()
+        print("Uploaded {} instances.".format(count))
+        print(client.transfer_summary())
 
 if __name__ == '__main__':
-    main()
+    run_main(main)
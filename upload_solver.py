@@ -4,33 +4,93 @@ import os
 import os.path
 import sys
 import argparse
-import requests
 import base64
+import hashlib
+import json
+from run_cache import default_cache_dir
+from smtlab_client import Client, add_client_arguments, check_response
+from smtlab_trace import run_main
+
+# a multiple of 3, so that the base64 encodings of consecutive chunks
+# concatenate without padding
+CHUNK_SIZE = 3 * 256 * 1024
+
+def solver_request_body(request, path):
+    # yields the JSON body of the upload request piece by piece,
+    # base64-encoding the binary as it is read from disk
+    yield (json.dumps(request)[:-1] + ', "base64_binary": "').encode('ascii')
+    with open(path, 'rb') as solver_file:
+        while True:
+            chunk = solver_file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield base64.b64encode(chunk)
+    yield b'"}'
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as solver_file:
+        while True:
+            chunk = solver_file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+def uploads_path():
+    return os.path.join(default_cache_dir(), "solvers.json")
+
+def load_uploads(path):
+    # {endpoint: {name: {'sha256', 'default_arguments', 'validation_solver', 'id'}}}
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f_uploads:
+        return json.load(f_uploads)
+
+def save_uploads(path, uploads):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f_uploads:
+        json.dump(uploads, f_uploads, indent=2)
+    os.replace(tmp_path, path)
 
 def main():
     parser = argparse.ArgumentParser(description="Upload solver binary to SMTLab")
     parser.add_argument('--verbose', action='store_true', default=False)
-    parser.add_argument('--endpoint', help="Base URL of API endpoint", default=os.environ['SMTLAB_API_ENDPOINT'])
+    add_client_arguments(parser)
     parser.add_argument('--arguments', help="Default command-line arguments for solver")
     parser.add_argument('--validation', action='store_true', default=False, help="Mark this solver as a validation solver")
+    parser.add_argument('--force', action='store_true', default=False, help="Upload even if this binary was already uploaded under this name")
     parser.add_argument("name", help="name of the solver to upload")
     parser.add_argument("path", help="path to solver binary")
 
-    username = os.environ['SMTLAB_USERNAME']
-    password = os.environ['SMTLAB_PASSWORD']
-
     args = parser.parse_args()
+    client = Client.from_args(args)
     new_solver_rq = {'name': args.name, 'validation_solver': args.validation}
     if args.arguments:
         new_solver_rq['default_arguments'] = args.arguments
-    with open(args.path, 'rb') as solver_file:
-        new_solver_rq['base64_binary'] = base64.b64encode(solver_file.read()).decode('ascii')
-    r = requests.post(args.endpoint + "/solvers", json=new_solver_rq, auth=(username, password))
-    if r.status_code != requests.codes.ok:
-        print(r.json())
-        r.raise_for_status()
+
+    # skip the upload if the same binary was already uploaded with these settings
+    uploads_file = uploads_path()
+    uploads = load_uploads(uploads_file)
+    # default_arguments is recorded even when not given, so that dropping
+    # --arguments counts as a change
+    record = {'sha256': file_sha256(args.path), 'default_arguments': new_solver_rq.get('default_arguments'),
+              'validation_solver': args.validation}
+    previous = uploads.get(client.endpoint, {}).get(args.name)
+    if not args.force and previous is not None and all(previous.get(k) == v for k, v in record.items()):
+        if args.verbose:
+            print("Solver {} is unchanged since it was uploaded as {}; skipping upload.".format(args.name, previous['id']))
+        return
+
+    r = client.post_encoded("/solvers", lambda: solver_request_body(new_solver_rq, args.path), headers={'Content-Type': 'application/json'})
+    check_response(r)
+    solver_id = r.json()['id']
+    uploads.setdefault(client.endpoint, {})[args.name] = dict(record, id=solver_id)
+    save_uploads(uploads_file, uploads)
     if args.verbose:
-        print("Created solver {}.".format(r.json()['id']))
+        print("Created solver {}.".format(solver_id))
+        print(client.transfer_summary())
 
 if __name__ == '__main__':
-    main()
+    run_main(main)